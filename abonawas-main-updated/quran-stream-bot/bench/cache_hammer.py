@@ -0,0 +1,137 @@
+# bench/cache_hammer.py
+"""
+عدّة عمليّات تتشارك مجلّد كاش واحد وتطلب نفس المقاطع عشوائيًا مع ميزانيّة
+صغيرة تُجبر على الإخلاء المستمر؛ كل «تشغيل» يأخذ Lease ويقرأ الملف كاملًا.
+
+    python bench/cache_hammer.py --procs 4 --rounds 40 --tracks 6
+    python bench/cache_hammer.py --ytdl          # عبر yt-dlp بدل مسار HTTP المباشر
+
+يُفترض: overlapping_downloads = 0 و broken_reads = 0 فى الوضعين (التداخل يُعدّ بين
+التنزيلات المكتملة فقط، فلا يدخله فحص yt-dlp المقطوع). مع --ytdl قد يزيد downloads
+عن التنزيلات الفعليّة: الفحص يكتمل أحيانًا على الملفات الصغيرة قبل أن يُغلق.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from bench import fakes                              # noqa: E402
+
+SECONDS = 4
+
+
+def _worker(idx: int, args, urls: list, out) -> None:
+    os.environ["CACHE_MAX_BYTES"] = str(args.budget)
+    os.environ["LOUDNORM"] = "1" if args.loudnorm else "0"
+    os.environ["SEARCH_CACHE_PERSIST"] = "0"
+    import logging
+    import mutagen
+    from modules.downloader import Downloader
+
+    logger = logging.getLogger(f"hammer-{idx}")
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+
+    async def main():
+        dl = Downloader(logger, download_dir=args.dir)
+        rnd = random.Random(idx)
+        lat, broken, errors = [], 0, 0
+        for _ in range(args.rounds):
+            url = rnd.choice(urls)
+            t = time.perf_counter()
+            try:
+                m = await dl.download(url)
+            except Exception:
+                errors += 1
+                continue
+            lat.append(time.perf_counter() - t)
+            lease = dl.cache.lease(m["path"])
+            if lease is None:                 # أُخلى قبل أخذ القفل: ليس تلفًا
+                continue
+            try:
+                await asyncio.sleep(rnd.uniform(0, 0.05))
+                f = mutagen.File(m["path"])
+                if f is None or abs(f.info.length - SECONDS) > 0.5:
+                    broken += 1
+            except Exception:
+                broken += 1
+            finally:
+                lease.close()
+        await dl.close()
+        return lat, broken, errors
+
+    out.put((idx,) + asyncio.run(main()))
+
+
+async def _run(args) -> None:
+    src = Path(tempfile.mkdtemp(prefix="hammer-src-"))
+    fakes.fresh_dir(Path(args.dir))
+    fakes.make_tracks(src, args.tracks, SECONDS)
+    # خادم بطىء عمدًا (يوسّع نافذة السباق) يعدّ التنزيلات المتداخلة لنفس الملف
+    server = fakes.AudioServer(src, args.port, rate=400 * 1024)
+    await server.start()
+    prefix = "y/" if args.ytdl else "a/"
+    suffix = "" if args.ytdl else ".opus"
+    urls = [f"http://127.0.0.1:{args.port}/{prefix}t{i}{suffix}" for i in range(args.tracks)]
+
+    ctx = multiprocessing.get_context("spawn")
+    out = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(i, args, urls, out)) for i in range(args.procs)]
+    t0 = time.perf_counter()
+    for p in procs:
+        p.start()
+    results = []
+    while len(results) < len(procs):          # الخادم يعمل على نفس الحلقة
+        while not out.empty():
+            results.append(out.get())
+        await asyncio.sleep(0.1)
+    for p in procs:
+        p.join()
+    wall = time.perf_counter() - t0
+    stats = await server.stop()
+    shutil.rmtree(src, ignore_errors=True)
+
+    lat = sorted(x for r in results for x in r[1])
+    ms = lambda v: round(v * 1000, 1)                                          # noqa: E731
+    print({
+        "procs": args.procs,
+        "requests": args.procs * args.rounds,
+        "downloads": sum(stats["gets"].values()),
+        "overlapping_downloads": stats["overlaps"],
+        "broken_reads": sum(r[2] for r in results),
+        "errors": sum(r[3] for r in results),
+        "latency_p50_ms": ms(statistics.median(lat)) if lat else None,
+        "latency_p99_ms": ms(lat[int(len(lat) * 0.99) - 1]) if lat else None,
+        "wall_s": round(wall, 1),
+        "files_left": len([p for p in Path(args.dir).iterdir()
+                           if p.is_file() and p.name != fakes.WORKDIR_MARK]),
+    })
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--procs", type=int, default=4)
+    ap.add_argument("--rounds", type=int, default=40)
+    ap.add_argument("--tracks", type=int, default=6)
+    ap.add_argument("--budget", type=int, default=100_000,
+                    help="CACHE_MAX_BYTES صغيرة لإجبار الإخلاء")
+    ap.add_argument("--dir", default=os.path.join(tempfile.gettempdir(), "hammer-cache"),
+                    help="مجلّد الكاش المشترك (يُمسح فقط إن كان فارغًا أو من تشغيل سابق)")
+    ap.add_argument("--port", type=int, default=8799)
+    ap.add_argument("--ytdl", action="store_true", help="التنزيل عبر yt-dlp")
+    ap.add_argument("--loudnorm", action="store_true")
+    args = ap.parse_args()
+    asyncio.run(_run(args))
+
+
+if __name__ == "__main__":
+    main()
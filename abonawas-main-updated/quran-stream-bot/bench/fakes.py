@@ -0,0 +1,328 @@
+# bench/fakes.py
+"""
+بدائل محلّيّة لكائنات Discord يكفى ما يستخدمه Player منها لتشغيله بلا اتصال:
+• FakeVoiceClient يقرأ من المصدر فى thread بإيقاع 20ms كـ discord.player.AudioPlayer
+  (ffmpeg حقيقى، بلا تشفير أو إرسال UDP) ويستدعى after ثم cleanup بنفس الترتيب
+• FakeInteraction يسجّل زمن أوّل ردّ (defer / send_message) وزمن آخر ردّ
+• زمن REST/Gateway الخاص بـ Discord غير محاكى: الأرقام تقيس كلفة البوت وحده
+• AudioServer و make_tracks: مقاطع مولّدة بـ ffmpeg على خادم HTTP محلّى بطىء عمدًا
+• fresh_dir: مجلّد عمل لا يُمسح إلا إن أنشأه اختبار سابق
+"""
+import asyncio
+import itertools
+import shutil
+import subprocess
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+import discord
+from aiohttp import web
+from imageio_ffmpeg import get_ffmpeg_exe
+
+FRAME_SEC = 0.02
+MIME = {"opus": "audio/opus", "mp3": "audio/mpeg"}
+WORKDIR_MARK = ".bench-workdir"
+_ids = itertools.count(10_000)
+
+
+# ---------- مجلّد العمل والمقاطع ---------- #
+def fresh_dir(path: Path) -> None:
+    """
+    مجلّد فارغ للاختبار. ما يوجد مسبقًا يُحذف فقط إن كان فارغًا أو يحمل علامة
+    WORKDIR_MARK (أنشأه اختبار سابق)؛ غير ذلك خطأ (--dir . لا يمسح نسخة العمل).
+    """
+    if path.exists():
+        if not path.is_dir() or (any(path.iterdir()) and not (path / WORKDIR_MARK).exists()):
+            raise SystemExit(f"❌ {path}: موجود ولم يُنشئه الاختبار؛ اختر --dir آخر")
+        shutil.rmtree(path)
+    path.mkdir(parents=True)
+    (path / WORKDIR_MARK).touch()
+
+
+def make_tracks(src: Path, n: int, seconds: float, fmt: str = "opus") -> None:
+    """t0…t<n-1>.<fmt>: نغمات مختلفة بطول seconds."""
+    codec = {"opus": ["-c:a", "libopus", "-b:a", "64k"],
+             "mp3":  ["-c:a", "libmp3lame", "-b:a", "128k"]}[fmt]
+    for i in range(n):
+        subprocess.run([get_ffmpeg_exe(), "-nostdin", "-loglevel", "error", "-y",
+                        "-f", "lavfi", "-i", f"sine=frequency={200 + 15 * i}:duration={seconds}",
+                        *codec, str(src / f"t{i}.{fmt}")], check=True)
+
+
+class AudioServer:
+    """
+    خادم المقاطع: /a/<name>.<fmt> (مسار HTTP المباشر) و /y/<name> (بلا امتداد → yt-dlp)،
+    بسرعة rate بايت/ث لكل اتصال مع دعم Range. الإحصاءات:
+    • downloads: تنزيلات مكتملة إلى الكاش؛ stream_gets: طلبات ffmpeg للبث (Lavf)
+    • peak / area / busy_s: التنزيلات المتزامنة (القمّة والمتوسّط أثناء الانشغال)
+    • gets: الطلبات لكل ملف؛ overlaps: تنزيلات مكتملة (جسم كامل أو Range) تداخل
+      زمنها لنفس الملف. الطلبات المقطوعة لا تُحسب: فحص yt-dlp (المستخرج العام)
+      يقرأ أوّل البايتات ثم يغلق، ورؤوسه مطابقة لطلب التنزيل الحقيقى
+    """
+    def __init__(self, src: Path, port: int, fmt: str = "opus", rate: int = 256 * 1024) -> None:
+        self.src, self.port, self.fmt, self.rate = src, port, fmt, rate
+        self.stats = {"downloads": 0, "stream_gets": 0, "peak": 0, "busy_s": 0.0,
+                      "area": 0.0, "gets": Counter(), "overlaps": 0}
+        self._active, self._last = 0, time.monotonic()
+        self._spans: Dict[str, List[tuple]] = {}      # name → [(بداية، نهاية)] للمكتملة
+        self._runner: Optional[web.AppRunner] = None
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_route("*", "/a/{name}." + self.fmt, self._handler)
+        app.router.add_route("*", "/y/{name}", self._handler)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, "127.0.0.1", self.port).start()
+
+    async def stop(self) -> dict:
+        self._account(0)
+        if self._runner is not None:
+            await self._runner.cleanup()
+        return self.stats
+
+    def _account(self, delta: int) -> None:
+        now = time.monotonic()
+        self.stats["area"] += self._active * (now - self._last)
+        if self._active:
+            self.stats["busy_s"] += now - self._last
+        self._active, self._last = self._active + delta, now
+        self.stats["peak"] = max(self.stats["peak"], self._active)
+
+    async def _handler(self, request: web.Request):
+        name = request.match_info["name"]
+        data = (self.src / f"{name}.{self.fmt}").read_bytes()
+        headers = {"Content-Type": MIME[self.fmt], "Accept-Ranges": "bytes"}
+        if request.method == "HEAD":
+            return web.Response(headers=dict(headers, **{"Content-Length": str(len(data))}))
+        start = request.http_range.start or 0
+        if start:
+            headers["Content-Range"] = f"bytes {start}-{len(data) - 1}/{len(data)}"
+        # ffmpeg (Lavf) = تشغيل مباشر من الرابط؛ الباقى = تنزيل إلى الكاش
+        streaming = request.headers.get("User-Agent", "").startswith("Lavf")
+        resp = web.StreamResponse(status=206 if start else 200, headers=headers)
+        resp.content_length = len(data) - start
+        if streaming:
+            self.stats["stream_gets"] += 1
+        else:
+            self.stats["gets"][name] += 1
+            self._account(+1)
+        began = time.monotonic()
+        try:
+            await resp.prepare(request)
+            chunk = 16 * 1024
+            for i in range(start, len(data), chunk):
+                await resp.write(data[i:i + chunk])
+                await asyncio.sleep(chunk / self.rate)
+            await resp.write_eof()
+            if not streaming:
+                self.stats["downloads"] += 1
+                spans = self._spans.setdefault(name, [])
+                self.stats["overlaps"] += sum(1 for _, end in spans if end > began)
+                spans.append((began, time.monotonic()))
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass                              # إيقاف/تخطٍّ أثناء البث، أو فحص yt-dlp
+        finally:
+            if not streaming:
+                self._account(-1)
+        return resp
+
+
+class FakeBot:
+    """ما يلمسه Player من commands.Bot."""
+    def __init__(self, ffmpeg_exe: str) -> None:
+        self.loop = asyncio.get_running_loop()
+        self.ffmpeg_exe = ffmpeg_exe
+        self.voice_clients: List["FakeVoiceClient"] = []
+        self.channels: Dict[int, object] = {}
+
+    def get_channel(self, channel_id: int):
+        return self.channels.get(channel_id)
+
+
+class FakeMessage:
+    def __init__(self, channel: Optional["FakeTextChannel"] = None) -> None:
+        self.id = next(_ids)
+        self.channel = channel
+        self.edits = 0
+
+    async def edit(self, **_kw) -> "FakeMessage":
+        self.edits += 1
+        return self
+
+
+class FakeTextChannel:
+    def __init__(self, bot: Optional[FakeBot] = None) -> None:
+        self.id = next(_ids)
+        self.sent = 0
+        if bot is not None:
+            bot.channels[self.id] = self
+
+    async def send(self, *_a, **_kw) -> FakeMessage:
+        self.sent += 1
+        return FakeMessage(self)
+
+
+class FakeVoiceClient:
+    def __init__(self, bot: FakeBot, channel: "FakeVoiceChannel",
+                 on_audio: Optional[Callable[[float], None]] = None) -> None:
+        self.bot = bot
+        self.channel = channel
+        self.on_audio = on_audio          # يُستدعى من thread الصوت عند أوّل حزمة لكل play
+        self.frames = 0                   # كل الحزم المُرسَلة (ثوانى البث = frames × 20ms)
+        self._connected = True
+        self._player: Optional[threading.Thread] = None
+        self._end = threading.Event()
+        self._resumed = threading.Event()
+
+    # ---------- واجهة VoiceClient ---------- #
+    def is_connected(self) -> bool:
+        return self._connected
+
+    def is_playing(self) -> bool:
+        return self._player is not None and self._resumed.is_set() and not self._end.is_set()
+
+    def is_paused(self) -> bool:
+        return self._player is not None and not self._resumed.is_set() \
+            and not self._end.is_set()
+
+    def play(self, source: discord.AudioSource, *, after=None, **_kw) -> None:
+        if not self._connected:
+            raise discord.ClientException("Not connected to voice.")
+        if self.is_playing():
+            raise discord.ClientException("Already playing audio.")
+        self._end, self._resumed = threading.Event(), threading.Event()
+        self._resumed.set()
+        self._player = threading.Thread(target=self._run,
+                                        args=(source, after, self._end, self._resumed),
+                                        daemon=True)
+        self._player.start()
+
+    def pause(self) -> None:
+        self._resumed.clear()
+
+    def resume(self) -> None:
+        self._resumed.set()
+
+    def stop(self) -> None:
+        if self._player is not None:
+            self._end.set()
+            self._resumed.set()
+            self._player = None
+
+    async def disconnect(self, *, force: bool = False) -> None:
+        self.stop()
+        self._connected = False
+        if self in self.bot.voice_clients:
+            self.bot.voice_clients.remove(self)
+
+    # ---------- thread الصوت ---------- #
+    def _run(self, source, after, end: threading.Event, resumed: threading.Event) -> None:
+        err = None
+        try:
+            loops, start, first = 0, time.perf_counter(), True
+            while not end.is_set():
+                if not resumed.is_set():
+                    resumed.wait()
+                    loops, start = 0, time.perf_counter()
+                    continue
+                data = source.read()
+                if not data:
+                    end.set()
+                    break
+                if first and self.on_audio:
+                    self.on_audio(time.monotonic())
+                first = False
+                self.frames += 1
+                loops += 1
+                time.sleep(max(0.0, start + FRAME_SEC * loops - time.perf_counter()))
+        except Exception as exc:
+            err = exc
+            end.set()
+        finally:
+            if after is not None:
+                after(err)
+            source.cleanup()
+
+
+class FakeVoiceChannel:
+    def __init__(self, bot: FakeBot, guild_id: int, listeners: int = 1,
+                 on_audio: Optional[Callable[[float], None]] = None) -> None:
+        self.id = next(_ids)
+        self.guild_id = guild_id
+        self.bot = bot
+        self.on_audio = on_audio
+        self.members = [FakeMember(self) for _ in range(listeners)]
+        bot.channels[self.id] = self
+        self.clients: List[FakeVoiceClient] = []      # كل اتصال أُنشئ (لجمع الإطارات)
+
+    async def connect(self, **_kw) -> FakeVoiceClient:
+        vc = FakeVoiceClient(self.bot, self, self.on_audio)
+        self.clients.append(vc)
+        self.bot.voice_clients.append(vc)
+        return vc
+
+
+class _VoiceState:
+    def __init__(self, channel: FakeVoiceChannel) -> None:
+        self.channel = channel
+
+
+class FakeMember:
+    def __init__(self, channel: Optional[FakeVoiceChannel] = None) -> None:
+        self.id = next(_ids)
+        self.bot = False
+        self.voice = _VoiceState(channel) if channel else None
+
+
+class _Response:
+    def __init__(self, itx: "FakeInteraction") -> None:
+        self._itx = itx
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    async def defer(self, **_kw) -> None:
+        self._reply()
+
+    async def send_message(self, *_a, **_kw) -> None:
+        self._reply()
+
+    def _reply(self) -> None:
+        if self._done:
+            raise discord.InteractionResponded(self._itx)   # كما يفعل Discord
+        self._done = True
+        self._itx.mark()
+
+
+class _Followup:
+    def __init__(self, itx: "FakeInteraction") -> None:
+        self._itx = itx
+
+    async def send(self, *_a, **_kw) -> FakeMessage:
+        self._itx.mark()
+        return FakeMessage(self._itx.channel)
+
+
+class FakeInteraction:
+    """تفاعل أمر واحد؛ acked_at = أوّل ردّ (مهلة الـ 3 ثوانٍ)، replied_at = آخر ردّ."""
+    def __init__(self, guild_id: int, user: FakeMember, channel: FakeTextChannel) -> None:
+        self.id = next(_ids)
+        self.guild_id = guild_id
+        self.user = user
+        self.channel = channel
+        self.response = _Response(self)
+        self.followup = _Followup(self)
+        self.created_at = time.monotonic()
+        self.acked_at: Optional[float] = None
+        self.replied_at: Optional[float] = None
+
+    def mark(self) -> None:
+        now = time.monotonic()
+        if self.acked_at is None:
+            self.acked_at = now
+        self.replied_at = now
@@ -0,0 +1,303 @@
+# bench/guild_load.py
+"""
+اختبار حمل بلا Discord ولا إنترنت: N سيرفر وهمى ينفّذ /stream و /queue و /skip
+و /plist-play على Player الحقيقى (Downloader، ffmpeg، الكاش، EmbedUpdater…).
+
+• خادم HTTP محلّى (عمليّة مستقلّة، لا يُحتسب فى CPU البوت) يقدّم مقاطع مولّدة
+  بـ ffmpeg بسرعة محدودة؛ يعدّ التنزيلات المتزامنة (طلبات ffmpeg للبث تُعدّ منفصلة)
+• bench/fakes.py: Interaction و VoiceClient وهميّان؛ الصوت يُقرأ بإيقاع حقيقى 20ms
+
+    python bench/guild_load.py --guilds 20 --duration 60
+    python bench/guild_load.py --guilds 50 --format mp3      # مسار إعادة الترميز
+    python bench/guild_load.py --ytdl                        # عبر yt-dlp بدل HTTP المباشر
+    STREAM_FIRST=0 python bench/guild_load.py                # أى متغيّر بيئة يُمرَّر كما هو
+
+المخرجات: زمن الأوامر (أوّل ردّ / اكتمال)، زمن أوّل صوت، الفجوات بين المقاطع،
+تزامن التنزيل، CPU لكل بثّ نشط، ونموّ الذاكرة.
+"""
+import argparse
+import asyncio
+import gc
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from pprint import pprint
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from imageio_ffmpeg import get_ffmpeg_exe            # noqa: E402
+
+from bench import fakes                              # noqa: E402
+
+
+# ---------- خادم الصوت (عمليّة مستقلّة) ---------- #
+def _server(src: str, port: int, fmt: str, rate: int, conn) -> None:
+    async def serve():
+        server = fakes.AudioServer(Path(src), port, fmt, rate)
+        await server.start()
+        conn.send("ready")
+        await asyncio.to_thread(conn.recv)
+        conn.send(await server.stop())
+    asyncio.run(serve())
+
+
+# ---------- السيرفرات الوهميّة ---------- #
+class Guild:
+    def __init__(self, gid: int, bot) -> None:
+        self.id = gid
+        self.voice = fakes.FakeVoiceChannel(bot, gid, on_audio=self._on_audio)
+        self.text = fakes.FakeTextChannel(bot)
+        self.user = self.voice.members[0]
+        self.loop = asyncio.get_running_loop()
+        self.expect: tuple | None = None      # (الأمر، بدايته) بانتظار أوّل صوت
+
+    def _on_audio(self, at: float) -> None:
+        self.loop.call_soon_threadsafe(self._first_audio, at)
+
+    def _first_audio(self, at: float) -> None:
+        if self.expect is not None:
+            cmd, t0 = self.expect
+            self.expect = None
+            RESULTS["ttfa"][cmd].append(at - t0)
+
+
+RESULTS = {"ack": defaultdict(list), "done": defaultdict(list),
+           "errors": defaultdict(int), "ttfa": defaultdict(list)}
+
+
+async def _invoke(cog, g: Guild, command: str, *, audio: bool = False, **kw) -> None:
+    """كما يفعل CommandTree: interaction_check ثم callback فى مهمّة مستقلّة."""
+    itx = fakes.FakeInteraction(g.id, g.user, g.text)
+    if audio:
+        g.expect = (command, itx.created_at)
+    cmd = getattr(cog, command.replace("-", "_"))
+
+    async def _run():
+        await cog.interaction_check(itx)
+        await cmd.callback(cog, itx, **kw)
+    try:
+        await asyncio.create_task(_run())
+    except Exception as exc:
+        RESULTS["errors"][f"{command}: {type(exc).__name__}"] += 1
+        return
+    end = time.monotonic()
+    RESULTS["ack"][command].append((itx.acked_at or end) - itx.created_at)
+    RESULTS["done"][command].append(end - itx.created_at)
+
+
+async def _guild_loop(cog, g: Guild, urls: list, args, stop: asyncio.Event) -> None:
+    rnd = random.Random(g.id)
+
+    async def think():
+        await asyncio.sleep(rnd.uniform(*args.think))
+
+    while not stop.is_set():
+        await _invoke(cog, g, "stop")
+        await _invoke(cog, g, "stream", audio=True, input=rnd.choice(urls))
+        await think()
+        await _invoke(cog, g, "queue")
+        await _invoke(cog, g, "stream", input=rnd.choice(urls))
+        await think()
+        await _invoke(cog, g, "skip")
+        await think()
+        await _invoke(cog, g, "queue")
+        await _invoke(cog, g, "stop")
+        await _invoke(cog, g, "plist-play", audio=True, name="bench")
+        for _ in range(2):
+            await think()
+            await _invoke(cog, g, "skip")
+        await _invoke(cog, g, "queue")
+        await think()
+
+
+# ---------- القياس ---------- #
+def _pct(values: list, q: float):
+    if not values:
+        return None
+    v = sorted(values)
+    return round(v[min(len(v) - 1, max(0, int(round(q * len(v))) - 1))] * 1000, 1)
+
+
+def _summary(values: list) -> dict:
+    return {"n": len(values), "p50_ms": _pct(values, 0.5), "p95_ms": _pct(values, 0.95),
+            "p99_ms": _pct(values, 0.99), "max_ms": _pct(values, 1.0)}
+
+
+def _cpu(who: int) -> float:
+    r = resource.getrusage(who)
+    return r.ru_utime + r.ru_stime
+
+
+async def _sampler(cog, stop: asyncio.Event, out: dict) -> None:
+    from modules.metrics import _rss_bytes
+    lags = out["loop_lag"]
+    while not stop.is_set():
+        t = time.perf_counter()
+        await asyncio.sleep(0.1)
+        lags.append(time.perf_counter() - t - 0.1)
+        out["rss_peak"] = max(out["rss_peak"], _rss_bytes())
+        out["sched_peak"] = max(out["sched_peak"], cog.dl.scheduler.running)
+
+
+def _on_loop_error(verbose: bool):
+    """استثناءات المهام الخلفيّة (_after، _prefetch، _fill_cache…) تُحتسب كأخطاء أيضًا."""
+    def handler(loop, context):
+        exc = context.get("exception")
+        fut = context.get("future") or context.get("task")
+        where = fut.get_coro().__qualname__ if isinstance(fut, asyncio.Task) else "loop"
+        what = type(exc).__name__ if exc else context.get("message", "?")
+        RESULTS["errors"][f"background {where}: {what}"] += 1
+        if verbose:
+            loop.default_exception_handler(context)
+    return handler
+
+
+async def _run(args) -> dict:
+    from cogs.player import Player
+    from modules import metrics
+
+    asyncio.get_running_loop().set_exception_handler(_on_loop_error(args.verbose))
+    bot = fakes.FakeBot(get_ffmpeg_exe())
+    cog = Player(bot)
+    if not args.verbose:
+        cog.logger.setLevel("WARNING")
+    await cog.cog_load()
+    await cog.on_ready()                      # كما فى الإقلاع الحقيقى (استعادة + لقطات)
+
+    prefix, suffix = ("y/", "") if args.ytdl else ("a/", "." + args.format)
+    urls = [f"http://127.0.0.1:{args.port}/{prefix}t{i}{suffix}" for i in range(args.tracks)]
+    guilds = [Guild(1000 + i, bot) for i in range(args.guilds)]
+    rnd = random.Random(0)
+    for g in guilds:                          # قائمة محفوظة لكل سيرفر (بلا بيانات بعد)
+        cog.store.create(g.id, g.user.id, "bench")
+        for url in rnd.sample(urls, min(args.plist, len(urls))):
+            cog.store.add_track(g.id, g.user.id, "bench", url)
+
+    gc.collect()
+    rss0 = metrics._rss_bytes()
+    cpu0, t0 = _cpu(resource.RUSAGE_SELF), time.perf_counter()
+    stop = asyncio.Event()
+    samp = {"loop_lag": [], "rss_peak": rss0, "sched_peak": 0}
+    sampler = asyncio.create_task(_sampler(cog, stop, samp))
+    tasks = []
+    for g in guilds:                          # دخول تدريجى خلال --ramp
+        tasks.append(asyncio.create_task(_guild_loop(cog, g, urls, args, stop)))
+        await asyncio.sleep(args.ramp / max(1, args.guilds))
+    await asyncio.sleep(max(0.0, args.duration - args.ramp))
+    stop.set()
+    for t in tasks:
+        t.cancel()
+    for r in await asyncio.gather(*tasks, sampler, return_exceptions=True):
+        if isinstance(r, Exception):
+            RESULTS["errors"][f"driver: {r!r}"] += 1
+
+    for g in guilds:                          # إيقاف كل التشغيل قبل القياس النهائى
+        await _invoke(cog, g, "stop")
+    await asyncio.sleep(0.5)
+    wall = time.perf_counter() - t0
+    cpu_bot = _cpu(resource.RUSAGE_SELF) - cpu0
+    rss_end = metrics._rss_bytes()
+    frames = sum(vc.frames for g in guilds for vc in g.voice.clients)
+    states, gaps = len(cog.states), list(cog.gaps)
+    hits = dict(metrics.CACHE_REQUESTS._values)
+    await cog.cog_unload()
+    gc.collect()                              # «Task exception was never retrieved» يظهر هنا
+    return {"wall": wall, "cpu_bot": cpu_bot, "rss0": rss0, "rss_end": rss_end,
+            "samp": samp, "stream_s": frames * fakes.FRAME_SEC, "states": states,
+            "gaps": gaps, "cache": {k[0]: int(v) for k, v in hits.items()}}
+
+
+async def _main(args) -> None:
+    work = Path(args.dir).resolve()
+    fakes.fresh_dir(work)
+    (work / "src").mkdir()
+    fakes.make_tracks(work / "src", args.tracks, args.seconds, args.format)
+    cpu_children0 = _cpu(resource.RUSAGE_CHILDREN)
+
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe()
+    server = ctx.Process(target=_server, daemon=True,
+                         args=(str(work / "src"), args.port, args.format, args.rate * 1024, child))
+    server.start()
+    await asyncio.to_thread(parent.recv)
+
+    # downloads/ و playlists.db و bot.log تُنشأ نسبةً إلى مجلّد العمل
+    os.chdir(work)
+    res = await _run(args)
+    # عمليّات ffmpeg المحصودة (وعمّال yt-dlp إن كانت عمليّات) قبل إيقاف الخادم
+    cpu_children = _cpu(resource.RUSAGE_CHILDREN) - cpu_children0
+    parent.send("stop")
+    srv = await asyncio.to_thread(parent.recv)
+    server.join(5)
+
+    stream_s = res["stream_s"]
+    mb = lambda b: round(b / 2**20, 1)                                          # noqa: E731
+    per_stream = lambda c: round(100 * c / stream_s, 2) if stream_s else None   # noqa: E731
+    pprint({
+        "guilds": args.guilds,
+        "wall_s": round(res["wall"], 1),
+        "commands": {name: {"ack": _summary(RESULTS["ack"][name]),
+                            "done": _summary(RESULTS["done"][name])}
+                     for name in sorted(RESULTS["ack"])},
+        "errors": dict(RESULTS["errors"]),
+        "time_to_first_audio": {k: _summary(v) for k, v in RESULTS["ttfa"].items()},
+        "track_gap": _summary(res["gaps"]),
+        "event_loop_lag": _summary(res["samp"]["loop_lag"]),
+        "downloads": {
+            "completed": srv["downloads"],
+            "peak_concurrent": srv["peak"],
+            "mean_concurrent_while_busy":
+                round(srv["area"] / srv["busy_s"], 2) if srv["busy_s"] else 0,
+            "scheduler_peak_running": res["samp"]["sched_peak"],
+            "ffmpeg_stream_gets": srv["stream_gets"],
+            "cache_requests": res["cache"],
+        },
+        "cpu": {
+            "stream_seconds": round(stream_s, 1),
+            "avg_active_streams": round(stream_s / res["wall"], 2),
+            "bot_s": round(res["cpu_bot"], 2),
+            "children_s": round(cpu_children, 2),
+            "bot_pct_per_stream": per_stream(res["cpu_bot"]),
+            "total_pct_per_stream": per_stream(res["cpu_bot"] + cpu_children),
+        },
+        "memory": {
+            "rss_start_mb": mb(res["rss0"]),
+            "rss_peak_mb": mb(res["samp"]["rss_peak"]),
+            "rss_end_mb": mb(res["rss_end"]),
+            "growth_mb": mb(res["rss_end"] - res["rss0"]),
+            "growth_kb_per_guild": round((res["rss_end"] - res["rss0"]) / 1024 / args.guilds, 1),
+            "guild_states": res["states"],
+        },
+    }, width=110, sort_dicts=False)
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--guilds", type=int, default=10)
+    ap.add_argument("--duration", type=float, default=60, help="ثوانى القياس")
+    ap.add_argument("--ramp", type=float, default=5, help="توزيع دخول السيرفرات (ثوانٍ)")
+    ap.add_argument("--think", type=float, nargs=2, default=(2, 5), metavar=("MIN", "MAX"),
+                    help="الانتظار بين أوامر نفس السيرفر (ثوانٍ)")
+    ap.add_argument("--tracks", type=int, default=12, help="مقاطع مختلفة على الخادم")
+    ap.add_argument("--plist", type=int, default=4, help="مقاطع القائمة المحفوظة لكل سيرفر")
+    ap.add_argument("--seconds", type=float, default=20, help="طول كل مقطع")
+    ap.add_argument("--format", choices=sorted(fakes.MIME), default="opus")
+    ap.add_argument("--rate", type=int, default=256, help="KB/s لكل اتصال بالخادم")
+    ap.add_argument("--ytdl", action="store_true", help="روابط بلا امتداد → yt-dlp")
+    ap.add_argument("--dir", default=os.path.join(tempfile.gettempdir(), "guild-load"),
+                    help="مجلّد عمل يُمسح (فقط إن كان فارغًا أو من تشغيل سابق)")
+    ap.add_argument("--port", type=int, default=8798)
+    ap.add_argument("--verbose", action="store_true", help="سجلّات Player كاملة")
+    args = ap.parse_args()
+    asyncio.run(_main(args))
+
+
+if __name__ == "__main__":
+    main()
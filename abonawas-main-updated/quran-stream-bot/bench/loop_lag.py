@@ -0,0 +1,78 @@
+# bench/loop_lag.py
+"""
+قياس تأخّر حلقة الأحداث أثناء N عمليّة بحث/استخراج متزامنة
+لكلٍّ من backend=thread و backend=process.
+
+    python bench/loop_lag.py --concurrency 8 --query "عبد الباسط الفاتحة"
+    python bench/loop_lag.py --url http://127.0.0.1:8000/sample.mp3   # بلا إنترنت
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from modules import ytdl_worker                      # noqa: E402
+from modules.downloader import ExtractorBackend      # noqa: E402
+
+TICK = 0.005
+
+
+async def _probe(lags: list, stop: asyncio.Event):
+    while not stop.is_set():
+        t = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - t - TICK)
+
+
+async def _run(kind: str, args) -> dict:
+    backend = ExtractorBackend(kind, args.workers)
+    # تسخين: لا نقيس زمن إنشاء العمّال
+    await asyncio.gather(*(backend.run(ytdl_worker.warm) for _ in range(args.workers)))
+
+    if args.url:
+        opts = {"quiet": True, "skip_download": True}
+        job = lambda: backend.run(ytdl_worker.extract, args.url, opts, False)  # noqa: E731
+    else:
+        job = lambda: backend.run(ytdl_worker.search, args.query, 5)           # noqa: E731
+
+    lags, stop = [], asyncio.Event()
+    probe = asyncio.create_task(_probe(lags, stop))
+    t0 = time.perf_counter()
+    res = await asyncio.gather(*(job() for _ in range(args.concurrency)),
+                               return_exceptions=True)
+    wall = time.perf_counter() - t0
+    stop.set(); await probe
+    backend.close()
+
+    lags.sort()
+    ms = lambda v: round(v * 1000, 2)                                          # noqa: E731
+    return {
+        "backend": kind,
+        "ok": sum(not isinstance(r, BaseException) for r in res),
+        "wall_s": round(wall, 2),
+        "lag_p50_ms": ms(statistics.median(lags)),
+        "lag_p99_ms": ms(lags[int(len(lags) * 0.99) - 1]),
+        "lag_max_ms": ms(lags[-1]),
+    }
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--workers", type=int, default=4)
+    ap.add_argument("--query", default="عبد الباسط عبد الصمد سورة الفاتحة")
+    ap.add_argument("--url", help="استخراج رابط بدل البحث (للقياس بلا إنترنت)")
+    ap.add_argument("--backend", choices=ExtractorBackend.KINDS + ("both",), default="both")
+    args = ap.parse_args()
+
+    kinds = ExtractorBackend.KINDS if args.backend == "both" else (args.backend,)
+    for kind in kinds:
+        print(asyncio.run(_run(kind, args)))
+
+
+if __name__ == "__main__":
+    main()
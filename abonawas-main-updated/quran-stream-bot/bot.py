@@ -1,15 +1,44 @@
 # bot.py
-import os
-import asyncio
-import discord
-from discord.ext import commands
-from imageio_ffmpeg import get_ffmpeg_exe
+import time
+_BOOT = time.perf_counter()           # قبل أى استيراد ثقيل: مرجع أزمنة الإقلاع
 
-from modules.logger_config import setup_logger
+import os                                            # noqa: E402
+import asyncio                                       # noqa: E402
+import hashlib                                       # noqa: E402
+import json                                          # noqa: E402
+from contextlib import contextmanager                # noqa: E402
+from pathlib import Path                             # noqa: E402
+
+import discord                                       # noqa: E402
+from discord.ext import commands                     # noqa: E402
+
+from modules import ffmpeg, metrics                  # noqa: E402
+from modules.logger_config import setup_logger       # noqa: E402
 
 logger = setup_logger("quran_bot")
-ffmpeg_exe = get_ffmpeg_exe()
-logger.info(f"Using ffmpeg executable at: {ffmpeg_exe}")
+
+# بصمة تعريف الأوامر عند آخر مزامنة ناجحة؛ SYNC_COMMANDS=1 يفرض المزامنة
+_SYNC_STAMP = Path("commands.sha256")
+
+
+class StartupTimer:
+    """أزمنة مراحل الإقلاع: تُسجَّل وتظهر فى /metrics كـ startup_seconds{phase}."""
+    def __init__(self) -> None:
+        self.phases: dict[str, float] = {}
+        metrics.gauge("startup_seconds", "زمن كل مرحلة من الإقلاع", ("phase",),
+                      fn=lambda: {(k,): v for k, v in self.phases.items()})
+
+    def mark(self, phase: str, seconds: float) -> None:
+        self.phases[phase] = seconds
+        logger.info(f"⏱️ startup {phase}: {seconds * 1000:.0f}ms")
+
+    @contextmanager
+    def phase(self, name: str):
+        t = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.mark(name, time.perf_counter() - t)
 
 
 class QuranBot(commands.Bot):
@@ -17,23 +46,87 @@ class QuranBot(commands.Bot):
         intents = discord.Intents.default()
         intents.voice_states = True
         super().__init__(command_prefix="!", intents=intents)
-        self.ffmpeg_exe = ffmpeg_exe
+        self.boot = StartupTimer()
+        self.boot.mark("imports", time.perf_counter() - _BOOT)
+        self._started_at = self._hooked_at = 0.0
+        self._ffmpeg_task: asyncio.Task | None = None
+        # METRICS_PORT: نقطة /metrics بصيغة Prometheus (معطّلة إن لم يُحدَّد)
+        port = os.getenv("METRICS_PORT")
+        self.metrics = (metrics.MetricsServer(os.getenv("METRICS_HOST", "0.0.0.0"), int(port))
+                        if port else None)
+
+    @property
+    def ffmpeg_exe(self) -> str:
+        return ffmpeg.ffmpeg_exe()
+
+    async def start(self, token: str, *, reconnect: bool = True) -> None:
+        self._started_at = time.perf_counter()
+        await super().start(token, reconnect=reconnect)
 
     # ------------------------
     async def setup_hook(self):
-        # Cogs المباشرة
-        from cogs.player import Player
+        self.boot.mark("login", time.perf_counter() - self._started_at)
+        # مسار ffmpeg يُحسب فى الخلفية بينما تُحمَّل الـ cogs وتتمّ المزامنة
+        self._ffmpeg_task = asyncio.create_task(self._resolve_ffmpeg())
+
+        with self.boot.phase("cogs"):
+            # Cogs المباشرة
+            from cogs.player import Player
+
+            await self.add_cog(Player(self))
+
+            # Cogs عبر load_extension (تستخدم setup)
+            await self.load_extension("cogs.help")
 
-        await self.add_cog(Player(self))
+        with self.boot.phase("command_sync"):
+            await self._sync_commands()
 
-        # Cogs عبر load_extension (تستخدم setup)
-        await self.load_extension("cogs.help")
+        if self.metrics:
+            await self.metrics.start()
+            logger.info(f"📈 metrics on :{self.metrics.port}/metrics")
+        self._hooked_at = time.perf_counter()
 
+    async def _resolve_ffmpeg(self):
+        try:
+            with self.boot.phase("ffmpeg"):
+                exe = await asyncio.to_thread(ffmpeg.ffmpeg_exe)
+        except Exception as exc:                   # يُعاد المحاولة عند أوّل تشغيل
+            logger.error(f"❌ ffmpeg غير متاح: {exc}")
+            return
+        logger.info(f"Using ffmpeg executable at: {exe}")
+
+    def _commands_hash(self) -> str:
+        payload = sorted((c.to_dict(self.tree) for c in self.tree.get_commands()),
+                         key=lambda d: (d.get("type", 1), d["name"]))
+        raw = json.dumps([self.application_id, payload], sort_keys=True,
+                         ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    async def _sync_commands(self):
+        """tree.sync فقط إن تغيّر تعريف الأوامر منذ آخر مزامنة (طلب بطىء ومحدود المعدّل)."""
+        digest = self._commands_hash()
+        try:
+            synced = _SYNC_STAMP.read_text().strip()
+        except OSError:
+            synced = None
+        if synced == digest and os.getenv("SYNC_COMMANDS") != "1":
+            logger.info("✅ Slash commands unchanged, sync skipped")
+            return
         await self.tree.sync()
+        _SYNC_STAMP.write_text(digest)
         logger.info("✅ Slash commands synced")
 
+    async def close(self):
+        if self.metrics:
+            await self.metrics.stop()
+        await super().close()
+
     async def on_ready(self):
         logger.info(f"🟢 Logged in as {self.user} ({self.user.id})")
+        if "gateway" not in self.boot.phases:     # on_ready يتكرّر مع كل إعادة اتصال
+            now = time.perf_counter()
+            self.boot.mark("gateway", now - self._hooked_at)
+            self.boot.mark("total", now - _BOOT)
 
 
 # ----------------------------
@@ -1,44 +1,161 @@
 # cogs/player.py
-import asyncio, re, discord
+import asyncio, os, re, shlex, time, discord
+from collections import deque
 from dataclasses import dataclass, field
-from datetime import datetime
+from types import SimpleNamespace
 from discord import app_commands
 from discord.ext import commands
-from mutagen.mp3 import MP3
 
-from modules.logger_config  import setup_logger
-from modules.downloader     import Downloader
+from modules.audio          import TrackedSource
+from modules.broadcast      import BroadcastHub
+from modules                import metrics
+from modules.logger_config  import log_context, setup_logger
+from modules.downloader     import Downloader, PRIORITY_NOW, PRIORITY_PREFETCH
+from modules.embed_updater  import EmbedUpdater
+from modules.file_lock      import Lease
 from modules.playlist_store import PlaylistStore   # ← النسخة الجديدة من المتجر
+from modules.queue_snapshot import QueueSnapshot
+from modules.search_index   import SearchIndex
+from modules.track          import Track, as_tracks
 
 _RX_URL = re.compile(r"https?://", re.I)
+_RECONNECT = "-reconnect 1 -reconnect_streamed 1 -reconnect_delay_max 5"
 
 
 # ────────────────── حالة كل Guild ────────────────── #
-@dataclass
+@dataclass(slots=True)
 class GuildState:
-    playlist:      list[dict]               = field(default_factory=list)
+    playlist:      list[Track]              = field(default_factory=list)
     index:         int                      = -1
     vc:            discord.VoiceClient | None = None
     msg:           discord.Message  | None  = None
-    timer:         asyncio.Task     | None  = None
+    source:        TrackedSource    | None  = None
     prefetch_task: asyncio.Task     | None  = None
+    # المقطع التالى: ffmpeg يعمل وأوّل الحزم مقروءة → انتقال فورى
+    next_source:   TrackedSource    | None  = None
+    next_item:     Track            | None  = None
+    last_gap:      float            | None  = None
+    # آخر أمر من المستخدمين / بداية الصمت (monotonic) لـ _reaper
+    last_active:   float                    = field(default_factory=time.monotonic)
+    idle_since:    float            | None  = None
+    # (المقطع، الموضع) حين قُطع الصوت بعد الصمت: أوّل تشغيل له يستأنف منه
+    resume:        tuple[Track, float] | None = None
+    # _play_current يجهّز مقطعًا (تنزيل/حلّ) ولم يبدأ الصوت بعد
+    starting:      bool                     = False
+
+
+class _Resumed:
+    """بديل Interaction لطابور مُستعاد بعد إعادة التشغيل (ما يلزم _play_current وما بعده)."""
+    id   = None
+    user = SimpleNamespace(voice=None)
+
+    def __init__(self, guild_id: int, channel: discord.abc.Messageable):
+        self.guild_id = guild_id
+        self.channel  = channel
 
 
 # ────────────────── Player Cog ────────────────── #
 class Player(commands.Cog):
     """بثّ تلاوات + إدارة قوائم تشغيل مخصّصة."""
     SEARCH_LIMIT = 5
+    # تشغيل فورى من رابط الوسائط بينما يُملأ الكاش فى الخلفية
+    STREAM_FIRST = os.getenv("STREAM_FIRST", "1") == "1"
+    # حلّ بيانات مقاطع القوائم المحفوظة: عدد طلبات yt-dlp المتزامنة
+    RESOLVE_CONCURRENCY = int(os.getenv("RESOLVE_CONCURRENCY", "4"))
+    # قطع الصوت بعد صمت (لا تشغيل أو لا مستمعين) وحذف حالة السيرفر الخامل (ثوانٍ)
+    IDLE_DISCONNECT = float(os.getenv("IDLE_DISCONNECT", "300"))
+    STATE_TTL       = float(os.getenv("STATE_TTL", "3600"))
+    REAPER_TICK     = 30
+    # لقطة الطوابير الحيّة على القرص كل SNAPSHOT_INTERVAL ثانية (0 = بلا إعادة تشغيل دافئة)
+    # وفاصل إعادة الاتصال بين السيرفرات عند الاستعادة (لا اندفاع اتصالات وتنزيلات)
+    SNAPSHOT_INTERVAL = float(os.getenv("SNAPSHOT_INTERVAL", "15"))
+    RESTORE_STAGGER   = float(os.getenv("RESTORE_STAGGER", "0.25"))
 
     def __init__(self, bot: commands.Bot):
         self.bot     = bot
         self.logger  = setup_logger(__name__)
         self.dl      = Downloader(self.logger)
-        self.store   = PlaylistStore()
+        self.store   = PlaylistStore(logger=self.logger)
         self.states: dict[int, GuildState] = {}
+        self.np      = EmbedUpdater(self.logger)
+        # البثوث الحيّة المشتركة: ffmpeg واحد لكل مصدر مهما تعدّدت السيرفرات
+        self.hub     = BroadcastHub()
+        # الفجوات بين المقاطع (ثوانٍ) لمتابعتها مع الوقت
+        self.gaps: deque[float] = deque(maxlen=500)
+        # بحث محلى فى العناوين المعروفة قبل اللجوء إلى يوتيوب
+        self.search  = SearchIndex()
+        self._search_ts = 0.0               # آخر accessed سُحب من فهرس الكاش
+        # الحذف من الكاش (إخلاء/ملف مفقود) يصل فورًا؛ قد يأتى من thread الإخلاء
+        self.dl.index.add_remove_listener(
+            lambda rec: self.bot.loop.call_soon_threadsafe(self.search.remove, rec["url"], "cache"))
+        # مقاطع القوائم المحفوظة معروفة العنوان حتى لو لم تُنزَّل بعد
+        for t in self.store.titled_tracks():
+            self.search.add(t["url"], t["title"], t.get("duration"), "playlist")
+        self.store.add_listener(self._on_saved_track)
+        # مقاطع القوائم المحفوظة والطوابير الحيّة لا تُخلى من الكاش
+        self.dl.cache.add_pin_provider(self.store.all_urls)
+        self.dl.cache.add_pin_provider(self._live_urls)
+        self._reaper_task: asyncio.Task | None = None
+        self.snapshots = QueueSnapshot()
+        self._snapshot_task: asyncio.Task | None = None
+        # لا كتابة فوق اللقطة السابقة قبل قراءتها
+        self._restored = False
+        self._register_metrics()
+
+    async def cog_load(self):
+        self.np.start()
+        self._reaper_task = asyncio.create_task(self._reaper())
+        if self.SNAPSHOT_INTERVAL > 0:
+            self._snapshot_task = asyncio.create_task(self._snapshotter())
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        # on_ready يتكرّر مع كل إعادة اتصال بالـ gateway؛ الاستعادة مرّة واحدة
+        if self.SNAPSHOT_INTERVAL > 0 and not self._restored:
+            self._restored = True
+            await self._restore()
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        # كل سجلّ أثناء الأمر (وفى المهام التى ينشئها) يحمل guild_id و interaction_id
+        log_context(interaction)
+        return True
+
+    async def cog_unload(self):
+        if self._reaper_task:
+            self._reaper_task.cancel()
+        if self._snapshot_task:
+            self._snapshot_task.cancel()
+        if self._restored:                  # إغلاق منظّم: آخر موضع بدقّة
+            try:
+                self.snapshots.save(self._snapshot())
+            except Exception as exc:
+                self.logger.warning(f"[snapshot] {exc}")
+        self.np.stop()
+        await self.dl.close()
+        self.store.close()
+
+    def _register_metrics(self):
+        metrics.gauge("voice_clients", "اتصالات صوتيّة نشطة",
+                      fn=lambda: len(self.bot.voice_clients))
+        metrics.gauge("guild_states", "حالات السيرفرات فى الذاكرة", fn=lambda: len(self.states))
+        metrics.gauge("queued_tracks", "عناصر كل الطوابير",
+                      fn=lambda: sum(len(st.playlist) for st in list(self.states.values())))
+        metrics.gauge("broadcasts", "بثوث حيّة مشتركة", fn=lambda: self.hub.active)
+        metrics.counter("embed_edits_total", "تعديلات رسائل «يُشغَّل الآن» (طلبات REST)",
+                        fn=lambda: self.np.edits)
+        metrics.counter("embed_edits_skipped_total", "تعديلات تُجوهلت لعدم تغيّر المحتوى",
+                        fn=lambda: self.np.skipped)
 
     # ───────────── أدوات مساعدة ───────────── #
     def _st(self, gid: int) -> GuildState:
-        return self.states.setdefault(gid, GuildState())
+        st = self.states.get(gid)
+        if st is None:
+            st = self.states[gid] = GuildState()
+        st.last_active = time.monotonic()
+        return st
+
+    def _live_urls(self) -> list[str]:
+        return [itm["url"] for st in self.states.values() for itm in st.playlist]
 
     @staticmethod
     def _fmt(sec: int) -> str:
@@ -72,21 +189,52 @@ class Player(commands.Cog):
             self.logger.warning(f"تعذّر الاتصال بالصوت: {e}")
             return False
 
-    # ───────────── البحث يوتيوب/فيسبوك ───────────── #
+    # ───────────── البحث: محلى أولًا ثم يوتيوب ───────────── #
+    async def _refresh_search(self):
+        # ما أُضيف للكاش أو استُخدم منذ آخر بحث (من هذه العمليّة أو غيرها) فقط؛
+        # القوائم المحفوظة والطوابير تُحدّث الفهرس بنفسها عند تغيّرها
+        self._search_ts, recs = await asyncio.to_thread(self.dl.index.changed_since,
+                                                        self._search_ts)
+        for rec in recs:
+            self.search.add(rec["url"], rec["title"], rec.get("duration"), "cache")
+
+    def _on_saved_track(self, url: str, track: dict | None):
+        if track is None:
+            self.search.remove(url, "playlist")
+        else:
+            self.search.add(url, track["title"], track.get("duration"), "playlist")
+
+    def _index_queue(self, gid: int, items: list[Track]):
+        # عناصر الطوابير الحيّة (مثل قوائم يوتيوب الموسّعة) لها عناوين أيضًا
+        for itm in items:
+            if "title" in itm:
+                self.search.add(itm["url"], itm["title"], itm.get("duration"), f"q{gid}")
+
+    def _unindex_queue(self, gid: int, st: GuildState):
+        for itm in st.playlist:
+            self.search.remove(itm["url"], f"q{gid}")
+
+    async def _search(self, query: str) -> list[dict]:
+        await self._refresh_search()
+        local = self.search.query(query, self.SEARCH_LIMIT)
+        if local and local[0][0] >= SearchIndex.MIN_SCORE:
+            self.logger.info(f"[بحث] local hit ({local[0][0]}): {query}")
+            return [{"url": r["url"],
+                     "title": r["title"],
+                     "duration": self._fmt(r["duration"] or 0),
+                     "thumb": None}
+                    for score, r in local if score >= SearchIndex.MIN_SCORE]
+        return await self._yt_search(query)
+
     async def _yt_search(self, query: str) -> list[dict]:
-        from yt_dlp import YoutubeDL
-        opts = {"quiet": True, "extract_flat": False,
-                "skip_download": True, "format": "bestaudio/best"}
         try:
-            data = await asyncio.to_thread(
-                lambda: YoutubeDL(opts).extract_info(
-                    f"ytsearch{self.SEARCH_LIMIT}:{query}", download=False))
+            data = await self.dl.search(query, self.SEARCH_LIMIT)
             res = []
-            for e in data.get("entries", []):
+            for e in data:
                 res.append({
                     "url": f"https://www.youtube.com/watch?v={e['id']}",
-                    "title": e.get("title", "—"),
-                    "duration": self._fmt(e.get("duration", 0)),
+                    "title": e.get("title") or "—",
+                    "duration": self._fmt(e.get("duration") or 0),
                     "thumb": e.get("thumbnail")
                 })
             return res
@@ -120,17 +268,21 @@ class Player(commands.Cog):
         await interaction.response.defer(thinking=True, ephemeral=True)
 
         async def _insert(url: str):
+            item = self._saved_item({"url": url}, (await self.dl.lookup_many([url])).get(url))
             try:
-                self.store.add_track(interaction.guild_id, interaction.user.id, name, url)
+                self.store.add_track(interaction.guild_id, interaction.user.id, name, url,
+                                     meta=item)
                 await interaction.followup.send("✅ أُضيف المقطع.", ephemeral=True)
             except (KeyError, PermissionError, ValueError) as e:
-                await interaction.followup.send(str(e), ephemeral=True)
+                return await interaction.followup.send(str(e), ephemeral=True)
+            if "title" not in item:
+                asyncio.create_task(self._fill_meta([item]))
 
         if self._is_url(input):
             return await _insert(input)
 
         # بحث وإظهار النتائج لاختيارها
-        results = await self._yt_search(input)
+        results = await self._search(input)
         if not results:
             return await interaction.followup.send("❌ لا توجد نتائج.", ephemeral=True)
 
@@ -173,15 +325,16 @@ class Player(commands.Cog):
     # -------- عرض المحتوى -------- #
     @app_commands.command(name="plist-show", description="عرض محتويات قائمة")
     async def plist_show(self, interaction: discord.Interaction, name: str):
-        urls = self.store.get_urls(interaction.guild_id, interaction.user.id, name)
-        if urls is None:
+        tracks = self.store.get_tracks(interaction.guild_id, interaction.user.id, name)
+        if tracks is None:
             return await interaction.response.send_message("❌ القائمة غير موجودة.", ephemeral=True)
-        if not urls:
+        if not tracks:
             return await interaction.response.send_message("القائمة فارغة.", ephemeral=True)
 
         emb = discord.Embed(title=f"قائمة: {name}", color=0x2ecc71)
-        for i, u in enumerate(urls, 1):
-            emb.add_field(name=str(i), value=u, inline=False)
+        for i, t in enumerate(tracks, 1):
+            value = f"{t['title']}\n{t['url']}" if t.get("title") else t["url"]
+            emb.add_field(name=str(i), value=value, inline=False)
         await interaction.response.send_message(embed=emb, ephemeral=True)
 
     # -------- حذف كامل -------- #
@@ -196,19 +349,57 @@ class Player(commands.Cog):
     # -------- تشغيل القائمة -------- #
     @app_commands.command(name="plist-play", description="تشغيل قائمة محفوظة")
     async def plist_play(self, interaction: discord.Interaction, name: str):
-        urls = self.store.get_urls(interaction.guild_id, interaction.user.id, name)
-        if urls is None:
+        tracks = self.store.get_tracks(interaction.guild_id, interaction.user.id, name)
+        if tracks is None:
             return await interaction.response.send_message("❌ القائمة غير موجودة.", ephemeral=True)
-        if not urls:
+        if not tracks:
             return await interaction.response.send_message("القائمة فارغة.", ephemeral=True)
 
         st = self._st(interaction.guild_id)
-        st.playlist = [{"url": u} for u in urls]
+        # الطابور كامل فورًا (بيانات محفوظة أو من الكاش)؛ الناقص يُحلّ دفعة واحدة فى الخلفية
+        self._unindex_queue(interaction.guild_id, st)
+        known = await self.dl.lookup_many(t["url"] for t in tracks if not t.get("title"))
+        st.playlist = [self._saved_item(t, known.get(t["url"])) for t in tracks]
+        self._index_queue(interaction.guild_id, st.playlist)
         st.index = -1
+        asyncio.create_task(self._fill_meta(st.playlist))
         await interaction.response.send_message(f"📜 تشغيل قائمة **{name}**.", ephemeral=True)
         if await self._ensure_voice(interaction):
             await self._play_current(interaction)
 
+    def _saved_item(self, track: dict, rec: dict | None) -> Track:
+        """
+        مقطع محفوظ → عنصر طابور: بياناته المحفوظة، وإلا rec (سجلّ فهرس الكاش
+        من Downloader.lookup_many، مجمّعًا لكل الأمر وخارج الحلقة).
+        """
+        item = Track(track["url"])
+        if track.get("title"):
+            item.update(title=track["title"], duration=track.get("duration"), id=track.get("id"))
+            return item
+        if rec is not None:
+            item.update(title=rec["title"], duration=rec.get("duration"), id=rec["id"])
+            self.store.set_meta(item["url"], rec["title"], rec.get("duration"), rec["id"])
+        return item
+
+    async def _fill_meta(self, items: list[Track]):
+        """حلّ بيانات العناصر الناقصة بتوازٍ محدود، وحفظها فى القوائم المحفوظة."""
+        pending: dict[str, list[Track]] = {}
+        for itm in items:
+            if "title" not in itm:
+                pending.setdefault(itm["url"], []).append(itm)
+        if not pending:
+            return
+        t0 = time.perf_counter()
+        async for url, meta in self.dl.resolve_many(pending, self.RESOLVE_CONCURRENCY):
+            if meta is None:
+                continue
+            for itm in pending[url]:
+                for k, v in meta.items():
+                    itm.setdefault(k, v)
+            self.store.set_meta(url, meta["title"], meta["duration"], meta["id"])
+        self.logger.info(f"[قوائم] حُلّت بيانات {len(pending)} مقطعًا "
+                         f"فى {time.perf_counter() - t0:.1f}s")
+
     # ════════════════════════════════
     #            /stream
     # ════════════════════════════════
@@ -225,7 +416,7 @@ class Player(commands.Cog):
             return await self._handle_stream(interaction, input)
 
         # بحث بالكلمات (ephemeral)
-        results = await self._yt_search(input)
+        results = await self._search(input)
         if not results:
             return await interaction.followup.send("❌ لا توجد نتائج.", ephemeral=True)
 
@@ -268,7 +459,7 @@ class Player(commands.Cog):
         e = discord.Embed(title="قائمة التشغيل", color=0x2ecc71)
         for i, itm in enumerate(st.playlist, 1):
             p = "▶️" if i-1 == st.index else "  "
-            e.add_field(name=f"{p} {i}.", value=itm["title"], inline=False)
+            e.add_field(name=f"{p} {i}.", value=itm.get("title", itm["url"]), inline=False)
         await interaction.response.send_message(embed=e, ephemeral=True)
 
     @app_commands.command(name="jump", description="الانتقال لمقطع معيّن")
@@ -296,7 +487,8 @@ class Player(commands.Cog):
             st.vc.resume()
             return await interaction.response.send_message("▶️ استئناف.", ephemeral=True)
 
-        if st.playlist and st.index == -1:
+        # طابور لم يبدأ، أو أُوقف بعد صمت طويل (يُستأنف من المقطع والموضع نفسيهما)
+        if st.playlist and (st.vc is None or self._stalled(st)):
             await interaction.response.defer(thinking=True)
             return await self._play_current(interaction)
 
@@ -315,17 +507,23 @@ class Player(commands.Cog):
         st = self._st(interaction.guild_id)
         if not st.playlist:
             return await interaction.response.send_message("🔹 الطابور فارغ.", ephemeral=True)
-        st.index = (st.index + 1) % len(st.playlist)
-        if st.vc: st.vc.stop()
+        # الانتقال للتالى يتمّ فى after؛ زيادة الفهرس هنا كانت تتخطّى مقطعين
+        if st.vc and (st.vc.is_playing() or st.vc.is_paused()):
+            st.vc.stop()
+        else:
+            st.index = (st.index + 1) % len(st.playlist)
         await interaction.response.send_message("⏭️ تم التخطي.", ephemeral=True)
 
     @app_commands.command(name="stop", description="إيقاف ومسح الطابور")
     async def stop(self, interaction: discord.Interaction):
         st = self._st(interaction.guild_id)
+        self._unindex_queue(interaction.guild_id, st)
         st.playlist.clear(); st.index = -1
+        st.source = None                     # after المصدر الموقوف لا يخصّ أى تشغيل لاحق
         if st.vc:
             st.vc.stop(); await st.vc.disconnect(); st.vc = None
-        if st.timer: st.timer.cancel()
+        self.np.unregister(interaction.guild_id)
+        self._discard_next(st)
         await interaction.response.send_message("⏹️ توقّف كل شيء.", ephemeral=True)
 
     # ════════════════════════════════
@@ -333,18 +531,55 @@ class Player(commands.Cog):
     # ════════════════════════════════
     async def _handle_stream(self, interaction: discord.Interaction, url: str):
         st = self._st(interaction.guild_id)
+        t0 = time.monotonic()
         try:
-            res = await self.dl.download(url)
+            res = await self._resolve_for_play(url)
         except Exception:
             return await interaction.followup.send("⚠️ المقطع غير متاح أو محجوب.", ephemeral=True)
 
-        st.playlist.append(res if isinstance(res, dict) else res[0])
-        await interaction.followup.send("✅ أُضيف المقطع.", ephemeral=True)
+        items = as_tracks(res)
+        if not items:
+            return await interaction.followup.send("❌ القائمة فارغة.", ephemeral=True)
+        items[0]["requested_at"] = t0
+        st.playlist.extend(items)
+        self._index_queue(interaction.guild_id, items)
+        await interaction.followup.send(
+            "✅ أُضيف المقطع." if len(items) == 1 else f"✅ أُضيفت {len(items)} مقاطع.",
+            ephemeral=True)
         if await self._ensure_voice(interaction):
-            if st.index == -1:
+            if self._stalled(st):
                 await self._play_current(interaction)
 
-    async def _play_current(self, interaction: discord.Interaction):
+    async def _resolve_for_play(self, url: str) -> list[Track]:
+        """كاش ← وإلا (فى وضع البث) رابط مباشر + تنزيل فى الخلفية ← وإلا تنزيل كامل."""
+        hit = await self.dl.cached(url)
+        if hit is not None:
+            return as_tracks(hit)
+        if self.STREAM_FIRST:
+            res = await self.dl.resolve(url)
+            if isinstance(res, list):        # قائمة تشغيل: عناصر خفيفة فقط
+                return as_tracks(res)
+            if res is not None:
+                item = Track.of(res)
+                if not item.is_live:          # البثّ الحىّ لا يُنزَّل
+                    asyncio.create_task(self._fill_cache(item))
+                return [item]
+        return as_tracks(await self.dl.download(url))
+
+    async def _fill_cache(self, item: Track):
+        try:
+            res = await self.dl.download(item["url"], priority=PRIORITY_PREFETCH)
+            if isinstance(res, dict):
+                item.update(res)
+        except Exception as exc:
+            self.logger.warning(f"تعذّر تخزين المقطع فى الكاش: {exc}")
+
+    async def _download_item(self, item: Track, priority: int = PRIORITY_NOW) -> dict:
+        return await self.dl.download(item["url"],
+                                      playlist_item=item.get("is_playlist_item") == "1",
+                                      priority=priority)
+
+    async def _play_current(self, interaction: discord.Interaction, offset: float = 0.0):
         st = self._st(interaction.guild_id)
         if not st.playlist:
             st.index = -1
@@ -354,65 +589,401 @@ class Player(commands.Cog):
 
         st.index = (st.index + 1) % len(st.playlist)
         item = st.playlist[st.index]
-        if "path" not in item:
-            item.update(await self.dl.download(item["url"]))
+        # المقطع الذى قُطع بعد الصمت (لا غيره بعد /skip أو /back) يُستأنف من موضعه
+        if st.resume and st.resume[0] is item:
+            offset = st.resume[1]
+        st.resume = None
+        st.starting = True
+        try:
+            lease = self._lease_file(item) if "path" in item else None
+            if "path" not in item and "stream_url" not in item:
+                if item.get("is_live"):
+                    res = await self.dl.resolve(item["url"])
+                    if not isinstance(res, dict):     # لا رابط مباشر للبثّ الآن
+                        await interaction.channel.send(
+                            f"⚠️ البثّ غير متاح حاليًا: {item.get('title', item['url'])}")
+                        return
+                    item.update(res)
+                else:
+                    item.update(await self._download_item(item))
+
+            # تشغيل فعلى (كسب الجهارة من الفهرس خارج الحلقة)
+            gain = await asyncio.to_thread(self._gain, item)
+            self._start(interaction, st, self._track(item, st, offset, lease, gain))
+        finally:
+            st.starting = False
+        await self._on_started(interaction, st)
+
+    @staticmethod
+    def _stalled(st: GuildState) -> bool:
+        """
+        متّصل ولا شىء يعمل أو يبدأ: طابور لم يبدأ، أو بعد قطع الصمت (الفهرس
+        قبل المقطع المقطوع)، أو طابور مُستعاد لم يُستأنف → التشغيل يبدأ من جديد.
+        """
+        return not (st.starting or st.vc.is_playing() or st.vc.is_paused())
+
+    def _start(self, interaction: discord.Interaction, st: GuildState,
+               src: TrackedSource):
+        st.source = src
+        # مصدر قديم ما زال يعمل (أوامر متسابقة) → يُوقف؛ after الخاص به يُتجاهَل فى _advance
+        if st.vc.is_playing() or st.vc.is_paused():
+            st.vc.stop()
+        # after يُستدعى من thread الصوت → العودة للحلقة بأمان (مع المصدر الذى انتهى)
+        st.vc.play(src,
+                   after=lambda e:
+                     self.bot.loop.call_soon_threadsafe(self._advance, interaction, src, e))
+
+    async def _on_started(self, interaction: discord.Interaction, st: GuildState):
+        item = st.playlist[st.index]
 
-        # prefetch الملفين التاليين
+        # prefetch الملفين التاليين (العناصر الخفيفة تُنزَّل هنا فقط) ثم تجهيز التالى
         async def _prefetch():
             idx = st.index
-            fut = []
+            items = []
             for off in (1, 2):
                 nxt = st.playlist[(idx + off) % len(st.playlist)]
-                if "url" in nxt and "path" not in nxt:
-                    fut.append(self.dl.download(nxt["url"]))
-            if fut:
-                await asyncio.gather(*fut, return_exceptions=True)
+                # البثّ الحىّ لا يُنزَّل (تيّار بلا نهاية يحجز مكانًا فى المجدول)
+                if "url" in nxt and "path" not in nxt and not nxt.get("is_live") \
+                        and all(nxt is not i for i in items):
+                    items.append(nxt)
+            res = await asyncio.gather(*(self._download_item(n, PRIORITY_PREFETCH)
+                                         for n in items),
+                                       return_exceptions=True)
+            for nxt, r in zip(items, res):
+                if isinstance(r, dict):
+                    nxt.update(r)
+            await self._prepare_next(st)
 
         if st.prefetch_task and not st.prefetch_task.done():
             st.prefetch_task.cancel()
         st.prefetch_task = asyncio.create_task(_prefetch())
 
-        # تشغيل فعلى
-        src = discord.FFmpegOpusAudio(item["path"],
-                                      executable=self.bot.ffmpeg_exe,
-                                      before_options="-nostdin",
-                                      options="-vn")
-        st.vc.play(src,
-                   after=lambda e:
-                     self.bot.loop.create_task(self._after(interaction, e)))
-
-        # embed معلومات
-        dur = int(MP3(item["path"]).info.length)
-        emb = (discord.Embed(title=item["title"], color=0x2ecc71)
-               .add_field(name="المدة", value=self._fmt(dur))
-               .set_footer(text=f"{st.index+1}/{len(st.playlist)}"))
+        # embed معلومات (المدة من الفهرس؛ التحديثات عبر EmbedUpdater المركزى)
+        emb = self._np_embed(st)
         if st.msg is None:
             st.msg = await interaction.channel.send(embed=emb)
         else:
             await st.msg.edit(embed=emb)
+        self.np.register(interaction.guild_id, st.msg, lambda: self._np_embed(st))
 
-        if st.timer: st.timer.cancel()
-        st.timer = self.bot.loop.create_task(self._ticker(interaction.guild_id))
+    # ───────────── انتقال بلا فجوة ───────────── #
+    async def _prepare_next(self, st: GuildState):
+        """فتح مصدر المقطع التالى وقراءة أوّل حزمه بينما يعمل الحالى."""
+        if not st.playlist:
+            return
+        nxt = st.playlist[(st.index + 1) % len(st.playlist)]
+        # روابط البث مؤقّتة والبثّ الحىّ مشترك → لا تجهيز مسبق لهما
+        if "path" not in nxt or nxt.get("is_live"):
+            return
+        if st.next_item is nxt and st.next_source is not None:
+            return
+        self._discard_next(st)
+        lease = self._lease_file(nxt)
+        if lease is None:                    # أُخلى → يُنزَّل من جديد عند دوره
+            return
+
+        def _build() -> TrackedSource:
+            src = self._track(nxt, st, lease=lease)
+            src.prime()
+            return src
 
-    async def _after(self, interaction: discord.Interaction, err):
+        fut = asyncio.ensure_future(asyncio.to_thread(_build))
+        try:
+            src = await asyncio.shield(fut)
+        except asyncio.CancelledError:
+            fut.add_done_callback(
+                lambda f: f.exception() is None and f.result().cleanup())
+            raise
+        st.next_source, st.next_item = src, nxt
+
+    def _discard_next(self, st: GuildState):
+        if st.next_source is not None:
+            st.next_source.cleanup()
+        st.next_source = st.next_item = None
+
+    def _advance(self, interaction: discord.Interaction, ended: TrackedSource, err):
+        """نهاية المقطع (على الحلقة): تسليم فورى للمصدر الجاهز إن طابق التالى."""
+        st = self._st(interaction.guild_id)
         if err:
-            self.logger.error("FFmpeg/Playback Error", exc_info=True)
+            self.logger.error("FFmpeg/Playback Error", exc_info=err)
+        # after متأخّر من مصدر أُوقف (/stop ثم تشغيل جديد) → ليس نهاية المقطع الحالى
+        if ended is not st.source:
+            return
+        # طابور ممسوح أو صوت قُطع عمدًا (/stop أو _reaper) → لا إعادة اتصال
+        if not st.playlist or st.vc is None:
+            self._discard_next(st)
+            return
+
+        nxt = (st.index + 1) % len(st.playlist)
+        src, item = st.next_source, st.next_item
+        st.next_source = st.next_item = None
+        if (src is not None and item is st.playlist[nxt]
+                and st.vc and st.vc.is_connected() and not st.vc.is_playing()):
+            st.index = nxt
+            self._start(interaction, st, src)
+            asyncio.create_task(self._on_started(interaction, st))
+            return
+
+        # skip/jump/restart أو لا مصدر جاهز → المسار العادى
+        if src is not None:
+            src.cleanup()
+        asyncio.create_task(self._after(interaction))
+
+    # ───────────── إعادة تشغيل دافئة ───────────── #
+    def _snapshot(self) -> dict[int, dict]:
+        """حالة الطوابير الحيّة (على الحلقة؛ التسلسل والكتابة فى thread)."""
+        out = {}
+        for gid, st in self.states.items():
+            if not st.playlist:
+                continue
+            vc = st.vc if st.vc and st.vc.is_connected() else None
+            out[gid] = {
+                "voice":  vc.channel.id if vc else None,
+                "text":   st.msg.channel.id if st.msg else None,
+                "index":  st.index,
+                "offset": round(st.source.elapsed, 1) if vc and st.source else 0.0,
+                "paused": bool(vc and vc.is_paused()),
+                "queue":  list(st.playlist),
+            }
+        return out
+
+    async def _snapshotter(self):
+        while True:
+            await asyncio.sleep(self.SNAPSHOT_INTERVAL)
+            if not self._restored:
+                continue
+            try:
+                await asyncio.to_thread(self.snapshots.save, self._snapshot())
+            except Exception as exc:
+                self.logger.warning(f"[snapshot] {exc}")
+
+    async def _restore(self):
+        """
+        الطوابير من آخر لقطة: الحالات فورًا (/queue و /play تعمل مباشرة)، ثم
+        تنزيل المقطع الحالى لكل السيرفرات قبل أى مقطع تالٍ، ثم إعادة الاتصال
+        بالتدريج (ما فى الكاش أوّلًا) والاستئناف من الموضع المحفوظ.
+        """
+        snap = await asyncio.to_thread(self.snapshots.load, self.STATE_TTL)
+        resume = []
+        for gid, g in snap.items():
+            if not g["queue"] or (gid in self.states and self.states[gid].playlist):
+                continue                          # أمر جديد سبق الاستعادة
+            st = self._st(gid)
+            st.playlist = g["queue"]
+            self._index_queue(gid, st.playlist)
+            idx = min(g["index"], len(st.playlist) - 1)
+            # كان يعمل → _play_current (أو /play) يتقدّم إلى المقطع نفسه
+            st.index = idx - 1 if g["voice"] else idx
+            voice = self.bot.get_channel(g["voice"]) if g["voice"] else None
+            text = self.bot.get_channel(g["text"]) if g["text"] else None
+            if voice and text and idx >= 0 and any(not m.bot for m in voice.members):
+                resume.append((gid, st, voice, text, g))
+        if not snap:
+            return
+        self.logger.info(f"♻️ استُعيد {len(snap)} طابورًا، يُستأنف {len(resume)} منها")
+
+        cached = await self.dl.lookup_many(st.playlist[st.index + 1]["url"]
+                                           for _, st, *_ in resume)
+        resume.sort(key=lambda r: r[1].playlist[r[1].index + 1]["url"] not in cached)
+        for _, st, *_ in resume:
+            self._warm(st.playlist[st.index + 1], PRIORITY_NOW)
+        for _, st, *_ in resume:
+            self._warm(st.playlist[(st.index + 2) % len(st.playlist)], PRIORITY_PREFETCH)
+        for i, (gid, st, voice, text, g) in enumerate(resume):
+            asyncio.create_task(self._resume(gid, st, voice, text, g, i * self.RESTORE_STAGGER))
+
+    def _warm(self, item: Track, priority: int):
+        if item.get("is_live") or "path" in item:
+            return
+
+        async def _run():
+            try:
+                res = await self._download_item(item, priority)
+                if isinstance(res, dict):
+                    item.update(res)
+            except Exception as exc:
+                self.logger.warning(f"تعذّر تجهيز المقطع المُستعاد: {exc}")
+        asyncio.create_task(_run())
+
+    async def _resume(self, gid: int, st: GuildState, voice, text, snap: dict, delay: float):
+        await asyncio.sleep(delay)
+        if st.vc is not None or not st.playlist:  # المستخدم سبق الاستئناف
+            return
+        itx = _Resumed(gid, text)
+        log_context(itx)
+        t0 = time.monotonic()
+        try:
+            st.vc = await voice.connect()
+            await self._play_current(itx, offset=snap["offset"])
+        except Exception as exc:
+            self.logger.warning(f"تعذّر استئناف الطابور: {exc}")
+            if st.vc is not None:
+                await self._go_idle(gid, st)
+            return
+        if snap["paused"]:
+            st.vc.pause()
+        self.logger.info(f"♻️ استئناف {st.index + 1}/{len(st.playlist)} عند "
+                         f"{self._fmt(snap['offset'])} خلال {time.monotonic() - t0:.2f}s")
+
+    # ───────────── ذاكرة ثابتة مع الوقت ───────────── #
+    async def _reaper(self):
+        """قطع الصوت بعد صمت IDLE_DISCONNECT، وحذف حالات السيرفرات الخاملة."""
+        while True:
+            await asyncio.sleep(self.REAPER_TICK)
+            now = time.monotonic()
+            for gid, st in list(self.states.items()):
+                try:
+                    if st.vc is not None:
+                        if self._is_silent(st):
+                            st.idle_since = st.idle_since or now
+                            if now - st.idle_since >= self.IDLE_DISCONNECT:
+                                await self._go_idle(gid, st)
+                        else:
+                            st.idle_since = None
+                    elif now - st.last_active >= self.STATE_TTL:
+                        self._drop_state(gid, st)
+                except Exception as exc:
+                    self.logger.warning(f"[reaper] {gid}: {exc}")
+
+    @staticmethod
+    def _is_silent(st: GuildState) -> bool:
+        vc = st.vc
+        if not vc.is_connected():
+            return True
+        # يعمل لقناة بلا مستمعين؛ الإيقاف المؤقّت مع حضورهم اختيار منهم لا صمت
+        listeners = any(not m.bot for m in vc.channel.members)
+        return not listeners or not (vc.is_playing() or vc.is_paused())
+
+    async def _go_idle(self, gid: int, st: GuildState):
+        vc, st.vc = st.vc, None                 # قبل stop: _advance لا يعيد الاتصال
+        # الموضع قبل تحرير المصدر (مقطع متوقّف مؤقّتًا فى قناة فرغت لا يبدأ من أوّله)
+        if st.source and 0 <= st.index < len(st.playlist):
+            st.resume = (st.playlist[st.index], st.source.elapsed)
+        vc.stop()
+        await vc.disconnect(force=True)
+        self._release(gid, st)
+        # /play يستأنف من المقطع الذى قُطع
+        st.index = max(-1, st.index - 1)
+        st.idle_since = None
+        st.last_active = time.monotonic()
+        self.logger.info(f"💤 قطع الصوت بعد صمت {self.IDLE_DISCONNECT:.0f}s (guild={gid})")
+
+    def _drop_state(self, gid: int, st: GuildState):
+        self._release(gid, st)
+        self._unindex_queue(gid, st)
+        del self.states[gid]
+        self.logger.debug(f"حُذفت حالة السيرفر الخامل {gid}")
+
+    def _release(self, gid: int, st: GuildState):
+        """إلغاء المهام وتحرير المصادر والمراجع؛ الطابور يبقى مضغوطًا."""
+        if st.prefetch_task and not st.prefetch_task.done():
+            st.prefetch_task.cancel()
+        st.prefetch_task = None
+        self._discard_next(st)
+        self.np.unregister(gid)
+        st.msg = st.source = None
+        for itm in st.playlist:
+            itm.compact()
+
+    def _record_gap(self, st: GuildState, gap: float):
+        st.last_gap = gap
+        self.gaps.append(gap)
+        metrics.GAP_SECONDS.observe(gap)
+        self.logger.info(f"↔️ inter-track gap={gap * 1000:.0f}ms")
+
+    def _np_embed(self, st: GuildState) -> discord.Embed | None:
+        if not (st.vc and st.source and 0 <= st.index < len(st.playlist)):
+            return None
+        item = st.playlist[st.index]
+        # الزمن المنقضى من الإطارات المُرسَلة فعلًا (لا ينجرف أثناء الإيقاف المؤقت)
+        return (discord.Embed(title=item.get("title", item["url"]), color=0x2ecc71)
+                .add_field(name="المدة", value=self._fmt(item.get("duration") or 0))
+                .add_field(name="المنقضى", value=self._fmt(st.source.elapsed))
+                .set_footer(text=f"{st.index+1}/{len(st.playlist)}"))
+
+    def _gain(self, item: dict) -> float:
+        """كسب الجهارة لملف الكاش (يقرأ الفهرس: يُستدعى خارج الحلقة)."""
+        # ملفات Opus تبقى stream copy ما لم يُطلب الكسب لها (LOUDNORM_COPY=1)
+        if "path" not in item or (item.get("codec") == "opus" and not self.dl.loudnorm_copy):
+            return 0.0
+        return self.dl.play_gain(item.get("id"))
+
+    def _make_source(self, item: dict, offset: float = 0.0,
+                     gain: float | None = None) -> discord.AudioSource:
+        # ملفات Opus تُمرَّر كما هى (stream copy) → لا ترميز أثناء التشغيل
+        codec = "copy" if item.get("codec") == "opus" else None
+        before, options = "-nostdin", "-vn"
+        if offset:                            # استئناف من منتصف المقطع (بحث قبل الفتح)
+            before += f" -ss {offset:.2f}"
+        if "path" in item:
+            src = item["path"]
+            # كسب الجهارة المحسوب مسبقًا: فلتر volume بسيط (None = يُقرأ هنا، من thread)
+            gain = self._gain(item) if gain is None else gain
+            if gain:
+                codec = None
+                options += f" -af volume={gain}dB"
+        else:
+            # رابط البث صالح لفترة محدودة → يُستخدم مرّة واحدة فقط
+            src = item.pop("stream_url")
+            before += " " + _RECONNECT
+            headers = "".join(f"{k}: {v}\r\n"
+                              for k, v in item.pop("http_headers", {}).items())
+            if headers:
+                before += " -headers " + shlex.quote(headers)
+        return discord.FFmpegOpusAudio(src,
+                                       codec=codec,
+                                       executable=self.bot.ffmpeg_exe,
+                                       before_options=before,
+                                       options=options)
+
+    def _lease_file(self, item: Track) -> Lease | None:
+        """
+        قفل مشترك على ملف الكاش قبل تشغيله. التثبيتات محلّيّة لكل عمليّة، فقد
+        تُخلى عمليّة أخرى (shard) ملفًا فى طابورنا لم يبدأ بعد → يُنسى مساره
+        ومعرّفه ليُعاد تنزيله عبر المجدول بدل تمرير مسار ميّت إلى ffmpeg.
+        """
+        lease = self.dl.cache.lease(item["path"])
+        # القفل قد ينتظر حذفًا جاريًا ثم يمسك ملفًا لم يعد له اسم
+        if lease is not None and os.path.exists(item["path"]):
+            return lease
+        if lease is not None:
+            lease.close()
+        self.logger.info(f"ملف الكاش أُخلى قبل تشغيله، يُعاد تنزيله: {item['url']}")
+        item.pop("path", None); item.pop("id", None)
+        return None
+
+    def _track(self, item: dict, st: GuildState | None = None,
+               offset: float = 0.0, lease: Lease | None = None,
+               gain: float | None = None) -> TrackedSource:
+        t0 = item.pop("requested_at", None)
+        prev = st.source if st else None
+        mode = "file" if "path" in item else "stream"
+        # قفل مشترك على ملف الكاش: لا تحذفه أى عمليّة (shard) أثناء التشغيل
+        if mode == "file" and lease is None:
+            lease = self.dl.cache.lease(item["path"])
+        if item.get("is_live") and "path" not in item:
+            mode = "broadcast"
+            src = self.hub.listen(item.get("id") or item["url"],
+                                  lambda: self._make_source(item))
+            item.pop("stream_url", None); item.pop("http_headers", None)
+            offset = 0.0
+        else:
+            src = self._make_source(item, offset, gain)
+
+        def _on_start(at: float):
+            # الفجوة تُقاس فقط بعد نهاية طبيعيّة للمقطع السابق
+            if prev is not None and prev.ended_at is not None:
+                self._record_gap(st, at - prev.ended_at)
+            if t0 is not None:
+                metrics.TTFA_SECONDS.observe(at - t0, mode=mode)
+                self.logger.info(f"⏱️ time-to-first-audio={at - t0:.2f}s "
+                                 f"mode={mode} url={item['url']}")
+        return TrackedSource(src, on_start=_on_start, lease=lease, offset=offset)
+
+    async def _after(self, interaction: discord.Interaction):
         if await self._ensure_voice(interaction):
             await self._play_current(interaction)
 
-    async def _ticker(self, gid: int):
-        st = self._st(gid)
-        start = datetime.utcnow()
-        while st.vc and st.vc.is_playing():
-            elapsed = int((datetime.utcnow() - start).total_seconds())
-            emb = st.msg.embeds[0]
-            if len(emb.fields) == 2:
-                emb.set_field_at(1, name="المنقضى", value=self._fmt(elapsed))
-            else:
-                emb.add_field(name="المنقضى", value=self._fmt(elapsed))
-            await st.msg.edit(embed=emb)
-            await asyncio.sleep(10)
-
 
 async def setup(bot: commands.Bot):
     await bot.add_cog(Player(bot))
@@ -0,0 +1,64 @@
+# modules/audio.py
+import time
+from collections import deque
+from typing import Callable, Optional
+
+import discord
+
+FRAME_SEC = 0.02    # كل حزمة Opus/PCM = 20ms
+
+
+class TrackedSource(discord.AudioSource):
+    """
+    غلاف حول أى AudioSource:
+    • يعدّ الإطارات المُرسَلة فعليًا (الزمن المنقضى الحقيقى، لا يتأثر بالإيقاف المؤقت)
+    • يستدعى on_start عند أوّل حزمة (لقياس زمن أوّل صوت والفجوة بين المقاطع)
+    • prime(): قراءة مسبقة لأوّل الحزم (ffmpeg يعمل ومخزّن) لانتقال بلا فجوة
+    • lease (اختيارى): قفل ملف الكاش، يُحرَّر مع cleanup()
+    • offset: موضع البدء (ثوانٍ) حين يبدأ المصدر من منتصف المقطع (-ss)
+    """
+    def __init__(self, original: discord.AudioSource,
+                 on_start: Optional[Callable[[float], None]] = None,
+                 lease=None, offset: float = 0.0) -> None:
+        self.original = original
+        self.on_start = on_start
+        self.lease = lease
+        self.offset = offset
+        self.frames = 0
+        self.started_at: Optional[float] = None
+        self.ended_at: Optional[float] = None     # انتهى المصدر طبيعيًا (لا skip/stop)
+        self._primed: deque = deque()
+
+    @property
+    def elapsed(self) -> float:
+        return self.offset + self.frames * FRAME_SEC
+
+    def prime(self, packets: int = 25) -> None:
+        """يُستدعى فى thread قبل التشغيل؛ لا يُحتسب فى الإطارات."""
+        for _ in range(packets):
+            data = self.original.read()
+            if not data:
+                break
+            self._primed.append(data)
+
+    def read(self) -> bytes:
+        data = self._primed.popleft() if self._primed else self.original.read()
+        if data:
+            now = time.monotonic()
+            if self.frames == 0:
+                self.started_at = now
+                if self.on_start:
+                    self.on_start(now)
+            self.frames += 1
+        elif self.ended_at is None:
+            self.ended_at = time.monotonic()
+        return data
+
+    def is_opus(self) -> bool:
+        return self.original.is_opus()
+
+    def cleanup(self) -> None:
+        self.original.cleanup()
+        if self.lease is not None:
+            self.lease.close()
+            self.lease = None
@@ -0,0 +1,153 @@
+# modules/broadcast.py
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+import discord
+
+from modules.audio import FRAME_SEC
+
+OPUS_SILENCE = b"\xf8\xff\xfe"
+
+
+class BroadcastListener(discord.AudioSource):
+    """
+    مشترك فى بثّ مشترك: لكل VoiceClient مخزنه الخاص (آخر ~1 ثانية)،
+    يبدأ من الحافّة الحيّة ويُلغى اشتراكه تلقائيًا عند cleanup.
+    """
+    MAX_BUFFER = 50      # حزم (20ms) → المستمع البطىء يفقد الأقدم ولا يؤخّر الآخرين
+
+    def __init__(self, broadcast: "Broadcast") -> None:
+        self.broadcast = broadcast
+        self._buf: deque = deque(maxlen=self.MAX_BUFFER)
+        self._cond = threading.Condition()
+        self._ended = False
+
+    def push(self, packet: Optional[bytes]) -> None:
+        with self._cond:
+            if packet is None:
+                self._ended = True
+            else:
+                self._buf.append(packet)
+            self._cond.notify()
+
+    def read(self) -> bytes:
+        with self._cond:
+            if not self._buf and not self._ended:
+                self._cond.wait(timeout=0.5)
+            if self._buf:
+                return self._buf.popleft()
+            # نهاية البثّ → إنهاء التشغيل؛ وإلا صمت حتى تصل الحزمة التالية
+            return b"" if self._ended else OPUS_SILENCE
+
+    def is_opus(self) -> bool:
+        return True
+
+    def cleanup(self) -> None:
+        self.broadcast.unsubscribe(self)
+
+
+class Broadcast:
+    """
+    مصدر Opus واحد (عمليّة ffmpeg واحدة) يُقرأ مرّة واحدة بإيقاع الزمن الحقيقى
+    فى thread ويُوزَّع على أى عدد من المستمعين؛ يتوقّف بعد GRACE ثوانٍ بلا مستمعين.
+    """
+    GRACE = 5.0
+
+    def __init__(self, key: str, source: discord.AudioSource,
+                 on_close: Callable[["Broadcast"], None]) -> None:
+        if not source.is_opus():
+            raise ValueError("البثّ المشترك يتطلّب مصدر Opus")
+        self.key = key
+        self.source = source
+        self._on_close = on_close
+        self._subs: list[BroadcastListener] = []
+        self._lock = threading.Lock()
+        self._empty_since: Optional[float] = None
+        self._thread = threading.Thread(target=self._pump, name=f"broadcast-{key}",
+                                        daemon=True)
+        self._started = False
+        self.closed = False
+
+    @property
+    def listeners(self) -> int:
+        return len(self._subs)
+
+    def subscribe(self) -> BroadcastListener:
+        sub = BroadcastListener(self)
+        with self._lock:
+            if self.closed:              # انتهى البثّ بين البحث والاشتراك
+                sub.push(None)
+                return sub
+            self._subs.append(sub)
+            self._empty_since = None
+            if not self._started:
+                self._started = True
+                self._thread.start()
+        return sub
+
+    def unsubscribe(self, sub: BroadcastListener) -> None:
+        with self._lock:
+            if sub in self._subs:
+                self._subs.remove(sub)
+            if not self._subs:
+                self._empty_since = time.monotonic()
+
+    def _pump(self) -> None:
+        start, loops = time.perf_counter(), 0
+        try:
+            while True:
+                with self._lock:
+                    subs = list(self._subs)
+                    idle = (self._empty_since is not None
+                            and time.monotonic() - self._empty_since > self.GRACE)
+                if idle:
+                    break
+
+                data = self.source.read()
+                if not data:
+                    break
+                for sub in subs:
+                    sub.push(data)
+
+                loops += 1
+                time.sleep(max(0.0, start + FRAME_SEC * loops - time.perf_counter()))
+        finally:
+            with self._lock:
+                self.closed = True
+                subs = list(self._subs)
+            for sub in subs:
+                sub.push(None)
+            self.source.cleanup()
+            self._on_close(self)
+
+
+class BroadcastHub:
+    """سجلّ البثوث المشتركة حسب المفتاح (معرّف المقطع)."""
+    def __init__(self) -> None:
+        self._casts: Dict[str, Broadcast] = {}
+        self._lock = threading.Lock()
+
+    def listen(self, key: str,
+               make_source: Callable[[], discord.AudioSource]) -> BroadcastListener:
+        """الاشتراك فى بثّ قائم أو إنشاؤه (make_source تُستدعى مرّة واحدة فقط)."""
+        with self._lock:
+            cast = self._casts.get(key)
+            if cast is None or cast.closed:
+                cast = Broadcast(key, make_source(), self._drop)
+                self._casts[key] = cast
+            return cast.subscribe()
+
+    def _drop(self, cast: Broadcast) -> None:
+        with self._lock:
+            if self._casts.get(cast.key) is cast:
+                del self._casts[cast.key]
+
+    @property
+    def active(self) -> int:
+        return len(self._casts)
+
+    @property
+    def listeners(self) -> int:
+        return sum(c.listeners for c in self._casts.values())
@@ -0,0 +1,212 @@
+# modules/cache_index.py
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from modules.canonical import media_id
+
+Entry = Dict[str, object]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id       TEXT PRIMARY KEY,
+    data     TEXT NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS aliases (
+    url TEXT PRIMARY KEY,
+    id  TEXT NOT NULL REFERENCES entries (id) ON DELETE CASCADE
+);
+CREATE INDEX IF NOT EXISTS idx_aliases_id ON aliases (id);
+"""
+
+
+class CacheIndex:
+    """
+    فهرس دائم للكاش، مشترك بين كل العمليّات التى تستخدم نفس المجلّد:
+    • url  → المعرّف القانونى (extractor:id)؛ الروابط غير المسجّلة تُوحَّد
+      بـ canonical.media_id فتصيب نفس السجلّ دون أى طلب شبكى
+    • المعرّف → {path, title, duration, codec, created, accessed, …}
+    يُحفظ فى SQLite (WAL) داخل مجلّد التنزيل: قرّاء متزامنون وكاتب واحد
+    فى كل لحظة، وكل put/remove معاملة واحدة تراها العمليّات الأخرى كاملة.
+    """
+    BATCH = 500            # متغيّرات كل استعلام IN (حدّ SQLite القديم 999)
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+        self._writes = 0
+        self._on_remove: List[Callable[[Entry], None]] = []
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(_SCHEMA)
+        self._migrate_json(path.with_suffix(".json"))
+
+    @property
+    def version(self) -> tuple:
+        """يتغيّر مع كل تعديل من هذه العمليّة أو غيرها (لإعادة بناء ما يعتمد على الفهرس)."""
+        with self._lock:
+            return self._writes, self._db.execute("PRAGMA data_version").fetchone()[0]
+
+    # ---------- أدوات داخليّة ---------- #
+    def _migrate_json(self, legacy: Path) -> None:
+        # الفهرس القديم (JSON لكل عمليّة) يُستورد مرّة واحدة
+        if not legacy.exists():
+            return
+        data = json.loads(legacy.read_text(encoding="utf-8"))
+        with self._lock, self._db:
+            for cid, rec in data.get("entries", {}).items():
+                self._db.execute("INSERT OR IGNORE INTO entries VALUES (?, ?, ?)",
+                                 (cid, json.dumps(rec, ensure_ascii=False),
+                                  rec.get("accessed", 0)))
+            self._db.executemany("INSERT OR IGNORE INTO aliases VALUES (?, ?)",
+                                 [(u, c) for u, c in data.get("aliases", {}).items()
+                                  if c in data.get("entries", {})])
+        legacy.rename(legacy.with_suffix(".json.migrated"))
+
+    def _row(self, row) -> Optional[Entry]:
+        if row is None:
+            return None
+        rec = json.loads(row[0])
+        rec["accessed"] = row[1]
+        return rec
+
+    def _get(self, cid: str) -> Optional[Entry]:
+        with self._lock:
+            return self._row(self._db.execute(
+                "SELECT data, accessed FROM entries WHERE id = ?", (cid,)).fetchone())
+
+    # ---------- استرجاع ---------- #
+    def lookup(self, url: str) -> Optional[Entry]:
+        """إرجاع سجلّ الرابط (إن وُجد) دون أى عمل شبكى."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT e.data, e.accessed FROM aliases a JOIN entries e ON e.id = a.id "
+                "WHERE a.url = ?", (url,)).fetchone()
+        if row is not None:
+            return self._row(row)
+        cid = media_id(url)
+        return self._get(cid) if cid else None
+
+    def _select_in(self, sql: str, keys: List[str]) -> Iterator[tuple]:
+        # sql يحوى {} مكان قائمة المتغيّرات؛ دفعات BATCH، والقفل يُحرَّر بينها للكتّاب
+        for i in range(0, len(keys), self.BATCH):
+            chunk = keys[i:i + self.BATCH]
+            with self._lock:
+                rows = self._db.execute(sql.format(",".join("?" * len(chunk))),
+                                        chunk).fetchall()
+            yield from rows
+
+    def _ids_for(self, urls: List[str]) -> Dict[str, str]:
+        known = dict(self._select_in("SELECT url, id FROM aliases WHERE url IN ({})", urls))
+        return {u: known.get(u) or media_id(u) or u for u in urls}
+
+    def resolve_ids(self, urls: Iterable[str]) -> Set[str]:
+        """resolve_id لمجموعة روابط باستعلامات مجمّعة (لا استعلام لكل رابط)."""
+        return set(self._ids_for(list(urls)).values())
+
+    def lookup_many(self, urls: Iterable[str]) -> Dict[str, Entry]:
+        """lookup لعدّة روابط باستعلامات مجمّعة: {url: سجلّ} للمعروف منها فقط."""
+        ids = self._ids_for(list(dict.fromkeys(urls)))
+        recs = {cid: self._row((data, accessed)) for cid, data, accessed in self._select_in(
+            "SELECT id, data, accessed FROM entries WHERE id IN ({})", list(set(ids.values())))}
+        return {u: recs[cid] for u, cid in ids.items() if cid in recs}
+
+    def resolve_id(self, url: str) -> str:
+        """المعرّف القانونى إن كان معروفًا، وإلا الرابط نفسه (مفتاح single-flight)."""
+        with self._lock:
+            row = self._db.execute("SELECT id FROM aliases WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else (media_id(url) or url)
+
+    def get(self, cid: str) -> Optional[Entry]:
+        return self._get(cid)
+
+    def entries(self) -> Iterator[Entry]:
+        with self._lock:
+            rows = self._db.execute("SELECT data, accessed FROM entries").fetchall()
+        return (self._row(r) for r in rows)
+
+    def changed_since(self, ts: float) -> Tuple[float, List[Entry]]:
+        """
+        السجلّات المضافة أو المستخدمة بعد ts (من أى عمليّة) وأحدث accessed بينها:
+        متابعة تزايديّة بلا قراءة الفهرس كلّه فى كل مرّة.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT data, accessed FROM entries WHERE accessed > ?", (ts,)).fetchall()
+        return max((r[1] for r in rows), default=ts), [self._row(r) for r in rows]
+
+    def unsized(self) -> List[Entry]:
+        """سجلّات أقدم من تتبّع الحجم."""
+        with self._lock:
+            rows = self._db.execute("SELECT data, accessed FROM entries "
+                                    "WHERE json_extract(data, '$.size') IS NULL").fetchall()
+        return [self._row(r) for r in rows]
+
+    def stats(self) -> tuple:
+        """(عدد السجلّات، مجموع أحجامها) داخل SQLite دون فكّ أى سجلّ."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(json_extract(data, '$.size')), 0) "
+                "FROM entries").fetchone()
+
+    # ---------- تعديل ---------- #
+    def put(self, cid: str, entry: Entry, urls: Iterable[str]) -> None:
+        now = time.time()
+        with self._lock, self._db:
+            old = self._row(self._db.execute(
+                "SELECT data, accessed FROM entries WHERE id = ?", (cid,)).fetchone()) or {}
+            aliases = set(old.get("urls", [])) | {u for u in urls if u}
+            rec = dict(entry, id=cid, created=now, accessed=now, urls=sorted(aliases))
+            self._db.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)",
+                             (cid, json.dumps(rec, ensure_ascii=False), now))
+            self._db.executemany("INSERT OR REPLACE INTO aliases VALUES (?, ?)",
+                                 [(u, cid) for u in aliases])
+            self._writes += 1
+
+    def update(self, cid: str, **fields) -> None:
+        with self._lock, self._db:
+            rec = self._row(self._db.execute(
+                "SELECT data, accessed FROM entries WHERE id = ?", (cid,)).fetchone())
+            if rec is None:
+                return
+            rec.update(fields)
+            self._db.execute("UPDATE entries SET data = ? WHERE id = ?",
+                             (json.dumps(rec, ensure_ascii=False), cid))
+            self._writes += 1
+
+    def touch(self, cid: str) -> None:
+        # عمود مستقل: تحديث صغير دون إعادة كتابة السجلّ
+        with self._lock, self._db:
+            self._db.execute("UPDATE entries SET accessed = ? WHERE id = ?",
+                             (time.time(), cid))
+
+    def add_remove_listener(self, fn: Callable[[Entry], None]) -> None:
+        """fn(rec) لكل سجلّ تحذفه هذه العمليّة (من أى thread: الإخلاء يعمل خارج الحلقة)."""
+        self._on_remove.append(fn)
+
+    def remove(self, cid: str) -> None:
+        self.remove_many([cid])
+
+    def remove_many(self, cids: List[str]) -> None:
+        if not cids:
+            return
+        with self._lock, self._db:
+            gone = [self._row(self._db.execute(
+                        "SELECT data, accessed FROM entries WHERE id = ?", (c,)).fetchone())
+                    for c in cids] if self._on_remove else []
+            self._db.executemany("DELETE FROM entries WHERE id = ?", [(c,) for c in cids])
+            self._writes += 1
+        for rec in gone:
+            if rec is not None:
+                for fn in self._on_remove:
+                    fn(rec)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
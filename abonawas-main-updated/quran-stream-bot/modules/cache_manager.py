@@ -0,0 +1,161 @@
+# modules/cache_manager.py
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional, Set
+
+from modules.cache_index import CacheIndex
+from modules.file_lock import KeyLocks, Lease, try_exclusive
+
+PinProvider = Callable[[], Iterable[str]]
+
+
+class CacheManager:
+    """
+    إدارة حجم الكاش:
+    • ميزانيّة بايتات ثابتة + إخلاء LRU (الأقدم وصولًا أوّلًا) من الفهرس مباشرةً
+      دون أى مسح لمجلّد التنزيل
+    • يُستدعى بعد اكتمال كل تنزيل، لا على مؤقّت
+    • المقاطع المُشار إليها (قوائم محفوظة / طوابير حيّة) مثبّتة لا تُحذف
+    • الإخلاء حتى LOW_WATER من الميزانيّة لتجنّب إخلاء عند كل تنزيل
+    • آمن بين العمليّات: ملف يحمل أى عمليّة عليه Lease (قيد التشغيل) لا يُحذف،
+      وعمليّة واحدة فقط تُخلى فى كل مرّة
+    """
+    LOW_WATER  = 0.9
+    ORPHAN_AGE = 3600      # ثوانٍ: ملفات التنزيل الجارية فى عمليّة أخرى تتجدّد باستمرار
+
+    def __init__(self, index: CacheIndex, max_bytes: int, logger,
+                 locks: Optional[KeyLocks] = None) -> None:
+        self.index = index
+        self.max_bytes = max_bytes
+        self.logger = logger
+        self.locks = locks
+        self._pins: List[PinProvider] = []
+        self._lock = threading.Lock()
+
+    # ---------- تثبيت ---------- #
+    def add_pin_provider(self, fn: PinProvider) -> None:
+        """fn تُرجع روابط يجب إبقاء ملفاتها (تُستدعى داخل حلقة الأحداث)."""
+        self._pins.append(fn)
+
+    def pinned_urls(self) -> Set[str]:
+        """روابط المقاطع المثبّتة (على الحلقة: نسخ نصوص فقط، المعرّفات تُحلّ فى enforce)."""
+        return {url for fn in self._pins for url in fn()}
+
+    @staticmethod
+    def lease(path: str) -> Optional[Lease]:
+        """قفل مشترك طوال تشغيل الملف؛ None إن اختفى الملف."""
+        try:
+            return Lease(path)
+        except OSError:
+            return None
+
+    # ---------- الحجم ---------- #
+    def _size(self, rec: dict) -> int:
+        size = rec.get("size")
+        if size is None:                     # سجلّات أقدم من تتبّع الحجم
+            try:
+                size = os.path.getsize(rec["path"])
+            except OSError:
+                size = 0
+            rec["size"] = size
+            self.index.update(rec["id"], size=size)     # مرّة واحدة لكل سجلّ قديم
+        return size
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._size(rec) for rec in self.index.entries())
+
+    # ---------- إخلاء ---------- #
+    def over_budget(self) -> bool:
+        """فحص رخيص بعد كل تنزيل: مجموع الأحجام داخل SQLite دون فكّ السجلّات."""
+        for rec in self.index.unsized():
+            self._size(rec)
+        return self.index.stats()[1] > self.max_bytes
+
+    def enforce(self, pinned_urls: Set[str], keep: Optional[str] = None) -> int:
+        """إخلاء LRU حتى تعود المساحة تحت الميزانيّة؛ يُرجع البايتات المحرّرة."""
+        guard = self.locks.try_acquire("evict") if self.locks else None
+        if self.locks and guard is None:
+            return 0                         # عمليّة أخرى تُخلى الآن
+        try:
+            with self._lock:
+                return self._enforce(pinned_urls, keep)
+        finally:
+            if guard is not None:
+                KeyLocks.release(guard)
+
+    def _enforce(self, pinned_urls: Set[str], keep: Optional[str]) -> int:
+        entries = list(self.index.entries())
+        total = sum(self._size(rec) for rec in entries)
+        if total <= self.max_bytes:
+            return 0
+        pinned = self.index.resolve_ids(pinned_urls)
+        if keep:
+            pinned.add(keep)
+
+        target = int(self.max_bytes * self.LOW_WATER)
+        victims, freed = [], 0
+        for rec in sorted(entries, key=lambda r: r.get("accessed", 0)):
+            if total - freed <= target:
+                break
+            if rec["id"] in pinned:
+                continue
+            if not self._delete(rec):
+                continue
+            victims.append(rec["id"])
+            freed += self._size(rec)
+
+        if total - freed > self.max_bytes:
+            self.logger.warning("الكاش فوق الميزانيّة رغم الإخلاء (مقاطع مثبّتة كثيرة)")
+        self.logger.info(f"🧹 cache evicted {len(victims)} files, "
+                         f"freed {freed / 2**20:.1f} MiB")
+        return freed
+
+    def _delete(self, rec: dict) -> bool:
+        """
+        حذف الملف وسجلّه معًا تحت قفل المفتاح، ما لم يكن قيد التنزيل
+        أو التشغيل فى أى عمليّة.
+        """
+        key = self.locks.try_acquire(rec["id"]) if self.locks else None
+        if self.locks and key is None:
+            return False
+        try:
+            if os.path.exists(rec["path"]):
+                fd = try_exclusive(rec["path"])
+                if fd is None:
+                    return False
+                try:
+                    os.unlink(rec["path"])
+                except OSError as exc:
+                    self.logger.warning(f"تعذّر حذف {rec['path']}: {exc}")
+                    return False
+                finally:
+                    os.close(fd)
+            self.index.remove(rec["id"])
+            return True
+        finally:
+            if key is not None:
+                KeyLocks.release(key)
+
+    def sweep_orphans(self, directory: Path) -> None:
+        """
+        مرّة واحدة عند الإقلاع: حذف ملفات لا يعرفها الفهرس (تنزيلات منقطعة).
+        ما لم يُعدَّل منذ ORPHAN_AGE فقط، كى لا يُمسّ تنزيل جارٍ فى عمليّة أخرى.
+        """
+        known = {Path(rec["path"]).name for rec in self.index.entries()}
+        cutoff = time.time() - self.ORPHAN_AGE
+        candidates = [p for p in directory.iterdir()
+                      if p.is_file() and not p.name.startswith(".")
+                      and p.name not in known
+                      and not p.name.startswith(self.index.path.name)]
+        staging = directory / ".tmp"
+        if staging.is_dir():
+            candidates += [p for p in staging.iterdir() if p.is_file()]
+        for p in candidates:
+            try:
+                if p.stat().st_mtime < cutoff:
+                    p.unlink()
+            except OSError:
+                pass
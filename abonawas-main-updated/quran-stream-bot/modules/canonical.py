@@ -0,0 +1,60 @@
+# modules/canonical.py
+"""
+توحيد الروابط دون أى طلب شبكى: صور رابط يوتيوب المختلفة لنفس المقطع
+(youtu.be، m.، music.، shorts، embed، watch?v=…&t=…&list=…) تُردّ إلى
+معرّف واحد بصيغة _canonical_id فى Downloader («Youtube:<id>»).
+"""
+import re
+from typing import Optional
+from urllib.parse import parse_qs, urlsplit, urlunsplit
+
+_YT_HOSTS = {"youtube.com", "www.youtube.com", "m.youtube.com", "music.youtube.com",
+             "youtube-nocookie.com", "www.youtube-nocookie.com"}
+_YT_SHORT = {"youtu.be", "www.youtu.be"}
+_YT_PATHS = {"shorts", "embed", "v", "live"}
+_YT_ID    = re.compile(r"^[0-9A-Za-z_-]{11}$")
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def media_id(url: str) -> Optional[str]:
+    """«Extractor:id» للمضيفات المعروفة، وإلا None."""
+    try:
+        p = urlsplit(url.strip())
+    except ValueError:
+        return None
+    host = (p.hostname or "").lower()
+    vid = None
+    if host in _YT_SHORT:
+        vid = p.path.strip("/").split("/")[0]
+    elif host in _YT_HOSTS:
+        if p.path.rstrip("/") == "/watch":
+            vid = parse_qs(p.query).get("v", [None])[0]
+        else:
+            parts = p.path.strip("/").split("/")
+            if len(parts) >= 2 and parts[0] in _YT_PATHS:
+                vid = parts[1]
+    if vid and _YT_ID.match(vid):
+        return f"Youtube:{vid}"
+    return None
+
+
+def normalize_url(url: str) -> str:
+    """شكل ثابت لأى رابط: مخطّط ومضيف بأحرف صغيرة، بلا fragment ولا منفذ افتراضى."""
+    try:
+        p = urlsplit(url.strip())
+        port = p.port
+    except ValueError:
+        return url
+    scheme = p.scheme.lower()
+    netloc = (p.hostname or "").lower()
+    if port and port != _DEFAULT_PORTS.get(scheme):
+        netloc += f":{port}"
+    return urlunsplit((scheme, netloc, p.path or "/", p.query, ""))
+
+
+def canonical_url(url: str) -> str:
+    """الرابط الذى يُمرَّر لـ yt-dlp: رابط watch نظيف للمقاطع المعروفة."""
+    mid = media_id(url)
+    if mid is not None and mid.startswith("Youtube:"):
+        return f"https://www.youtube.com/watch?v={mid.split(':', 1)[1]}"
+    return normalize_url(url)
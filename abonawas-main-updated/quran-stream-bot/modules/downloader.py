@@ -1,97 +1,675 @@
 import asyncio
+import copy
 import hashlib
+import heapq
+import itertools
 import os
-from datetime import datetime, timedelta
+import re
+import threading
+import time
+import uuid
+from concurrent.futures import Executor, TimeoutError as FutureTimeout
+from datetime import timedelta
 from pathlib import Path
-from typing import Dict, List, Union
+from typing import (Any, AsyncIterator, Callable, Dict, Iterable, List, Optional, Set, Tuple,
+                    Union)
+from urllib.parse import urlparse
 
-from imageio_ffmpeg import get_ffmpeg_exe
-from yt_dlp import YoutubeDL
-from yt_dlp.utils import DownloadError
+import aiohttp
 
+from modules import ffmpeg, loudness, metrics, ytdl_worker
+from modules.cache_index import CacheIndex
+from modules.canonical import canonical_url, normalize_url
+from modules.cache_manager import CacheManager
+from modules.file_lock import KeyLocks
+from modules.http_fetch import HttpFetcher, NotAudio
 from modules.logger_config import setup_logger
+from modules.search_index import normalize_ar
+from modules.ttl_cache import TTLCache
+from modules.ytdl_worker import ExtractError
 
 Media = Dict[str, str]
 MediaOrPlaylist = Union[Media, List[Media]]
 
+# نوع ملف mutagen → اسم الترميز (opus يعنى إمكان التشغيل بـ stream copy)
+_CODECS = {"OggOpus": "opus", "MP3": "mp3", "MP4": "aac", "OggVorbis": "vorbis",
+           "FLAC": "flac", "WAVE": "pcm"}
+
+PRIORITY_NOW      = 0     # المقطع الذى ينتظره المستمع الآن
+PRIORITY_PREFETCH = 10    # تحميل مسبق / ملء الكاش فى الخلفية
+
+
+class _Job:
+    __slots__ = ("key", "priority", "future", "cancel", "waiters", "started")
+
+    def __init__(self, key: str, priority: int, future: asyncio.Future) -> None:
+        self.key = key
+        self.priority = priority
+        self.future = future
+        self.cancel = threading.Event()   # يُفحص داخل thread التنزيل
+        self.waiters = 0
+        self.started = False
+
+
+class DownloadScheduler:
+    """
+    جدولة التنزيلات:
+    • single-flight: الطلبات المتزامنة لنفس المفتاح تشترك فى future واحد
+    • حدّ أقصى عام لعدد التنزيلات الجارية
+    • أولويّة: «يُشغَّل الآن» قبل التحميل المسبق (الطلب الأعلى يرفع أولويّة المهمّة)
+    • إلغاء حقيقى: حين يُلغى آخر منتظر تُحذف المهمّة من الطابور
+      أو يُطلب من yt-dlp التوقّف إن كانت قد بدأت
+    """
+    def __init__(self, max_concurrent: int = 3) -> None:
+        self.max_concurrent = max_concurrent
+        self._jobs: Dict[str, _Job] = {}
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._running = 0
+        # مراجع قويّة للمهام الجارية: الحلقة لا تحتفظ إلا بمراجع ضعيفة
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def submit(self, key: str, fn: Callable[..., Any], *args,
+                     priority: int = PRIORITY_NOW) -> Any:
+        """
+        تنفيذ fn(*args, cancel_event) مرّة واحدة لكل مفتاح:
+        فى thread، أو على الحلقة مباشرة إن كانت fn دالّة async.
+        """
+        job = self._jobs.get(key)
+        if job is None:
+            job = _Job(key, priority, asyncio.get_running_loop().create_future())
+            self._jobs[key] = job
+            self._push(job, fn, args)
+        elif priority < job.priority and not job.started:
+            job.priority = priority
+            self._push(job, fn, args)
+
+        job.waiters += 1
+        try:
+            return await asyncio.shield(job.future)
+        except asyncio.CancelledError:
+            job.waiters -= 1
+            if job.waiters == 0 and not job.future.done():
+                self._abort(job)
+            raise
+
+    @property
+    def pending(self) -> int:
+        return len(self._heap)
+
+    def close(self) -> None:
+        """إلغاء كل ما فى الطابور وما يجرى (عند إغلاق Downloader)."""
+        self._heap.clear()
+        for job in list(self._jobs.values()):
+            self._abort(job)
+        for task in list(self._tasks):
+            task.cancel()
+
+    @property
+    def running(self) -> int:
+        return self._running
+
+    # ---------- داخلى ---------- #
+    def _push(self, job: _Job, fn, args) -> None:
+        heapq.heappush(self._heap, (job.priority, next(self._seq), job, fn, args))
+        self._pump()
+
+    def _pump(self) -> None:
+        while self._running < self.max_concurrent and self._heap:
+            prio, _, job, fn, args = heapq.heappop(self._heap)
+            # مدخلات قديمة (رُفعت أولويّتها أو أُلغيت أو بدأت)
+            if job.started or job.future.done() or prio != job.priority:
+                continue
+            job.started = True
+            self._running += 1
+            task = asyncio.get_running_loop().create_task(self._run(job, fn, args))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, job: _Job, fn, args) -> None:
+        try:
+            if asyncio.iscoroutinefunction(fn):
+                res = await fn(*args, job.cancel)
+            else:
+                res = await asyncio.to_thread(fn, *args, job.cancel)
+            if not job.future.done():
+                job.future.set_result(res)
+        except BaseException as exc:
+            if not job.future.done():
+                job.future.set_exception(exc)
+        finally:
+            self._running -= 1
+            if self._jobs.get(job.key) is job:
+                del self._jobs[job.key]
+            self._pump()
+
+    def _abort(self, job: _Job) -> None:
+        job.cancel.set()
+        job.future.cancel()
+        if self._jobs.get(job.key) is job:
+            del self._jobs[job.key]
+
+
+class ExtractorBackend:
+    """
+    مكان تشغيل yt-dlp:
+    • thread (افتراضى): نفس العمليّة، يتنافس على الـ GIL مع حلقة discord.py
+    • process: ProcessPoolExecutor بعمّال دافئة (yt-dlp محمّل مسبقًا)،
+      النتائج dicts بسيطة والإلغاء عبر ملف-علم يفحصه العامل
+    """
+    KINDS = ("thread", "process")
+
+    def __init__(self, kind: str = "thread", workers: int = 2,
+                 flag_dir: Optional[Path] = None) -> None:
+        if kind not in self.KINDS:
+            raise ValueError(f"backend غير معروف: {kind}")
+        self.kind = kind
+        self.flag_dir = flag_dir or Path(".")
+        self._pool: Optional[Executor] = None
+        if kind == "process":
+            # multiprocessing يُستورد فقط لهذا الـ backend
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+            self._pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=ytdl_worker.warm,
+            )
+            for _ in range(workers):          # تشغيل العمّال الآن لا عند أوّل طلب
+                self._pool.submit(ytdl_worker.warm)
+
+    def call(self, fn: Callable[..., Any], *args,
+             cancel: Optional[threading.Event] = None) -> Any:
+        """استدعاء متزامن (يُستخدم من داخل thread)."""
+        if self._pool is None:
+            return fn(*args, cancel=cancel) if cancel is not None else fn(*args)
+        if cancel is None:
+            return self._pool.submit(fn, *args).result()
+
+        flag = self.flag_dir / f".cancel-{uuid.uuid4().hex}"
+        fut = self._pool.submit(fn, *args, cancel=str(flag))
+        try:
+            while True:
+                try:
+                    return fut.result(timeout=0.25)
+                except FutureTimeout:
+                    if cancel.is_set() and not flag.exists():
+                        flag.touch()
+        finally:
+            flag.unlink(missing_ok=True)
+
+    async def run(self, fn: Callable[..., Any], *args) -> Any:
+        if self._pool is None:
+            return await asyncio.to_thread(fn, *args)
+        return await asyncio.get_running_loop().run_in_executor(self._pool, fn, *args)
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
 
 class Downloader:
     """
     تنزيل صوتيات مع:
-    • كاش باسم sha256(url) لمنع التنزيل المكرّر
-    • تنظيف تلقائى: 3 أيام للملفات الفردية، 10 أيام لملفات قوائم التشغيل
-    • تنزيل متوازٍ (يُستخدم من Player)
+    • كاش بحسب المحتوى: اسم الملف = المفتاح (extractor, id, الصيغة) مثل
+      Youtube-<id>.opus، وصور الرابط المختلفة لنفس المقطع تُوحَّد دون شبكة
+      (modules.canonical) → نسخة واحدة لكل مقطع
+    • فهرس دائم (url → id → ملف) يسمح بالتشغيل من الكاش دون أى طلب لـ yt-dlp
+    • صيغة الكاش opus (افتراضيًا): نحتفظ بتيار Opus الأصلى كما هو (remux إلى Ogg)
+      فيُشغَّل لاحقًا بـ stream copy بلا أى ترميز؛ أو mp3 للتوافق القديم
+    • قوائم التشغيل تُقرأ بشكل مسطّح (flat): عناصر خفيفة (url, title, duration)
+      ولا يُنزَّل أى عنصر إلا عند وصول نافذة التحميل المسبق إليه
+    • صلاحيّة السجلّ: 3 أيام للملفات الفردية، 10 أيام لعناصر قوائم التشغيل
+    • بيانات المقطع (المدة، معدّل البت، الترميز) تُقرأ مرّة واحدة عند التخزين
+      وتُحفظ فى الفهرس وتُحمل فى عناصر الطابور → لا قراءة ملفات عند التشغيل
+    • الجهارة تُقاس مرّة واحدة فى الخلفية وتُحفظ ككسب ثابت فى الفهرس
+      (الملف لا يُعاد ترميزه؛ الكسب يُطبَّق عند التشغيل)
+    • نتائج البحث (مسطّحة) وبيانات الروابط المحلولة فى ذاكرة TTL + LRU
+    • حجم محدود عبر CacheManager (LRU + تثبيت المقاطع المُشار إليها)
+    • تنزيل متوازٍ محدود عبر DownloadScheduler (single-flight + أولويّات)
+    • آمن بين العمليّات على نفس المجلّد: فهرس SQLite مشترك، قفل ملف لكل مفتاح
+      أثناء تنزيله، والتنزيل فى .tmp ثم نشر ذرّى بـ os.replace
+    • الروابط الصوتية المباشرة (mp3/ogg/…) تُنزَّل عبر HttpFetcher بلا yt-dlp
+      ولا postprocessing، مع استكمال التنزيل وإعادة التحقّق بـ ETag/Last-Modified
     """
     SINGLE_TTL   = timedelta(days=3)
     PLAYLIST_TTL = timedelta(days=10)
+    FORMATS      = ("opus", "mp3")
 
-    def __init__(self, logger=None, download_dir: str = "downloads"):
+    def __init__(self, logger=None, download_dir: str = "downloads",
+                 audio_format: Optional[str] = None):
         self.logger = logger or setup_logger(__name__)
         self.dir = Path(download_dir)
+        self.audio_format = audio_format or os.getenv("AUDIO_FORMAT", "opus")
+        if self.audio_format not in self.FORMATS:
+            raise ValueError(f"صيغة غير مدعومة: {self.audio_format}")
         self.dir.mkdir(exist_ok=True)
-        self.ffmpeg_exe = get_ffmpeg_exe()
+        self.staging = self.dir / ".tmp"        # ملفات غير مكتملة لا تظهر بأسمائها النهائيّة
+        self.staging.mkdir(exist_ok=True)
+        self.index = CacheIndex(self.dir / "index.db")
+        self.locks = KeyLocks(self.dir)
+        self.scheduler = DownloadScheduler(int(os.getenv("MAX_DOWNLOADS", "3")))
+        self.backend = ExtractorBackend(os.getenv("YTDL_BACKEND", "thread"),
+                                        int(os.getenv("YTDL_WORKERS", "2")),
+                                        flag_dir=self.dir)
+        self.cache = CacheManager(self.index,
+                                  int(os.getenv("CACHE_MAX_BYTES", str(5 * 2**30))),
+                                  self.logger, locks=self.locks)
+        self.cache.sweep_orphans(self.dir)
+        self.http = HttpFetcher()
 
-        # ■ إنشاء مهمّة التنظيف فقط إذا كانت هناك حلقة أحداث تعمل
-        try:
-            asyncio.get_running_loop().create_task(self._cleanup())
-        except RuntimeError:
-            # سيتم إنشاء المهمّة لاحقًا عندما تبدأ الحلقة (مثلاً داخل bot.start)
-            pass
+        self.loudnorm = os.getenv("LOUDNORM", "1") == "1"
+        # الكسب على ملفات Opus يُسقط stream copy → ترميز فى كل تشغيل (اختيارى)
+        self.loudnorm_copy = os.getenv("LOUDNORM_COPY", "0") == "1"
+        self.loudness_target = float(os.getenv("LOUDNESS_TARGET", "-16"))
+        self._loud_q: Optional[asyncio.Queue] = None
+        self._loud_task: Optional[asyncio.Task] = None
+
+        # استعلام مُوحَّد → نتائج؛ رابط → بيانات محلولة (روابط البث تنتهى بعد ساعات)
+        self.search_cache = TTLCache(
+            512, 6 * 3600,
+            Path("search_cache.json") if os.getenv("SEARCH_CACHE_PERSIST", "1") == "1" else None)
+        self.resolve_cache = TTLCache(256, 30 * 60)
+        self._register_metrics()
+
+    @property
+    def ffmpeg_exe(self) -> str:
+        return ffmpeg.ffmpeg_exe()
 
     # ---------- واجهة عامّة ---------- #
-    async def download(self, url: str) -> MediaOrPlaylist:
-        """تنزيل الملف إن لم يكن فى الكاش."""
-        info = await asyncio.to_thread(self._extract, url)
+    async def download(self, url: str, *, playlist_item: bool = False,
+                       priority: int = PRIORITY_NOW) -> MediaOrPlaylist:
+        """
+        تنزيل الملف إن لم يكن فى الكاش.
+        لقوائم التشغيل: قائمة عناصر خفيفة بلا ملفات (تُنزَّل لاحقًا عند الحاجة).
+        """
+        hit = await self.cached(url)
+        if hit is not None:
+            self.logger.debug(f"cache hit: {url}")
+            metrics.CACHE_REQUESTS.inc(result="hit")
+            return hit
+        metrics.CACHE_REQUESTS.inc(result="miss")
+        key = await asyncio.to_thread(self.index.resolve_id, url)
+        res = await self.scheduler.submit(key, self._fetch_locked,
+                                          url, playlist_item, priority=priority)
+        if isinstance(res, dict):
+            self._queue_loudness(res["id"])
+            await self.evict(keep=res["id"])
+        return res
+
+    async def cached(self, url: str) -> Optional[Media]:
+        """المقطع من الكاش إن كان صالحًا، وإلا None؛ لا شبكة، والفهرس والقرص فى thread."""
+        return await asyncio.to_thread(self._from_cache, url)
+
+    async def lookup_many(self, urls: Iterable[str]) -> Dict[str, dict]:
+        """سجلّات الفهرس لعدّة روابط (عناوين ومدد بلا شبكة) باستعلام مجمّع فى thread."""
+        return await asyncio.to_thread(self.index.lookup_many, list(urls))
+
+    async def evict(self, keep: Optional[str] = None) -> None:
+        """
+        فرض ميزانيّة الكاش: الفحص فى thread، وتحت الميزانيّة لا شىء آخر. فوقها فقط
+        تُجمع روابط التثبيت على الحلقة (حالتها) وتُحلّ معرّفاتها مع الحذف فى thread.
+        """
+        if not await asyncio.to_thread(self.cache.over_budget):
+            return
+        await asyncio.to_thread(self.cache.enforce, self.cache.pinned_urls(), keep)
+
+    async def resolve(self, url: str) -> Optional[MediaOrPlaylist]:
+        """
+        رابط الوسائط المباشر دون تنزيل (للتشغيل الفورى أثناء التنزيل).
+        لقوائم التشغيل: قائمة عناصر خفيفة؛ None إن لم يوجد رابط مباشر.
+        """
+        # نسخة عميقة: المستهلك يستهلك stream_url من العنصر
+        key = await asyncio.to_thread(self.index.resolve_id, url)
+        hit = self.resolve_cache.get(key)
+        if hit is not None:
+            return copy.deepcopy(hit)
+        res = await self._resolve(url)
+        if res is not None:
+            self.resolve_cache.set(key, copy.deepcopy(res))
+        return res
+
+    async def _resolve(self, url: str) -> Optional[MediaOrPlaylist]:
+        if HttpFetcher.is_candidate(url):
+            try:
+                meta = await self.http.probe(url)
+            except (NotAudio, aiohttp.ClientError, asyncio.TimeoutError):
+                pass                                  # نترك الحكم لـ yt-dlp
+            else:
+                return {
+                    "url": url,
+                    "title": meta["title"],
+                    "stream_url": url,
+                    "http_headers": {},
+                    "duration": None,
+                    "codec": "opus" if meta["content_type"] == "audio/opus" else None,
+                    "id": self._direct_id(url),
+                    "is_live": False,
+                }
+        info = await asyncio.to_thread(self._extract, url, False)
         if info.get("_type") == "playlist":
-            return [self._build_media(e, is_playlist=True) for e in info["entries"]]
-        return self._build_media(info, is_playlist=False)
+            return self._expand(info)
+        if not info.get("url"):
+            return None
+        return {
+            "url": info.get("original_url") or info.get("webpage_url") or url,
+            "title": info.get("title") or "—",
+            "stream_url": info["url"],
+            "http_headers": info.get("http_headers") or {},
+            "duration": info.get("duration"),
+            "codec": info.get("acodec"),
+            "id": self._canonical_id(info),
+            "is_live": bool(info.get("is_live")),
+        }
+
+    async def resolve_many(self, urls: Iterable[str], concurrency: int = 4
+                           ) -> AsyncIterator[Tuple[str, Optional[dict]]]:
+        """
+        بيانات (title, duration, id) لعدّة روابط: من الفهرس إن وُجدت، وإلا
+        resolve بتوازٍ محدود. تُعاد (url, meta) فور جاهزيّة كلٍّ منها؛
+        meta = None إن تعذّر الحلّ.
+        """
+        sem = asyncio.Semaphore(concurrency)
+        urls = list(dict.fromkeys(urls))
+        known = await self.lookup_many(urls)
+
+        async def _one(url: str):
+            rec = known.get(url)
+            if rec is None:
+                async with sem:
+                    try:
+                        rec = await self.resolve(url)
+                    except Exception as exc:
+                        self.logger.warning(f"تعذّر حلّ {url}: {exc}")
+                        rec = None
+            if not isinstance(rec, dict):
+                return url, None
+            return url, {"title": rec["title"], "duration": rec.get("duration"),
+                         "id": rec["id"]}
+
+        for fut in asyncio.as_completed([_one(u) for u in urls]):
+            yield await fut
+
+    async def search(self, query: str, limit: int) -> List[dict]:
+        """
+        بحث يوتيوب (بيانات خام: id, title, duration, thumbnail).
+        استخراج مسطّح: الصيغ تُحلّ فقط عند اختيار نتيجة.
+        """
+        key = f"{limit}:{normalize_ar(query)}"
+        hit = self.search_cache.get(key)
+        if hit is not None:
+            return hit
+        with metrics.EXTRACT_SECONDS.time(op="search"):
+            res = await self.backend.run(ytdl_worker.search, query, limit)
+        if res:
+            self.search_cache.set(key, res)
+        return res
+
+    def play_gain(self, cid: Optional[str]) -> float:
+        """الكسب (dB) الواجب تطبيقه عند التشغيل؛ 0 إن لم يُقس بعد (يقرأ الفهرس: خارج الحلقة)."""
+        rec = self.index.get(cid) if cid else None
+        return (rec or {}).get("gain_db") or 0.0
+
+    async def close(self) -> None:
+        if self._loud_task:
+            self._loud_task.cancel()
+        self.scheduler.close()
+        self.search_cache.save()
+        self.backend.close()
+        await self.http.close()
 
     # ---------- داخلى ---------- #
-    def _extract(self, url: str) -> dict:
+    def _register_metrics(self) -> None:
+        # مجاميع من الفهرس مباشرة (الأحجام المسجّلة، بلا stat لكل ملف)
+        metrics.gauge("cache_bytes", "حجم ملفات الكاش على القرص",
+                      fn=lambda: self.index.stats()[1])
+        metrics.gauge("cache_files", "عدد المقاطع فى فهرس الكاش",
+                      fn=lambda: self.index.stats()[0])
+        metrics.gauge("downloads_running", "تنزيلات جارية", fn=lambda: self.scheduler.running)
+        metrics.gauge("downloads_queued", "تنزيلات فى الطابور", fn=lambda: self.scheduler.pending)
+        metrics.counter("memo_requests_total", "ذاكرة البحث/الحلّ حسب النتيجة",
+                        ("cache", "result"),
+                        fn=lambda: {("search", "hit"): self.search_cache.hits,
+                                    ("search", "miss"): self.search_cache.misses,
+                                    ("resolve", "hit"): self.resolve_cache.hits,
+                                    ("resolve", "miss"): self.resolve_cache.misses})
+
+    async def _fetch_locked(self, url: str, playlist_item: bool = False,
+                            cancel: Optional[threading.Event] = None) -> MediaOrPlaylist:
+        # قفل المفتاح عبر العمليّات؛ إن أنهته عمليّة أخرى أثناء الانتظار نأخذ نسختها
+        fd = await asyncio.to_thread(
+            lambda: self.locks.acquire(self.index.resolve_id(url), cancel))
+        try:
+            hit = await self.cached(url)
+            if hit is not None:
+                return hit
+            if HttpFetcher.is_candidate(url):
+                with metrics.DOWNLOAD_SECONDS.time(path="http"):
+                    return await self._fetch_direct(url, playlist_item, cancel)
+            with metrics.DOWNLOAD_SECONDS.time(path="ytdl"):
+                return await asyncio.to_thread(self._fetch, url, playlist_item, cancel)
+        finally:
+            KeyLocks.release(fd)
+
+    def _fetch(self, url: str, playlist_item: bool = False,
+               cancel: Optional[threading.Event] = None) -> MediaOrPlaylist:
+        # يعمل داخل thread: استخراج + نقل للكاش + تحديث الفهرس
+        info = self._extract(url, cancel=cancel)
+        if info.get("_type") == "playlist":
+            return self._expand(info)
+        return self._build_media(info, is_playlist=playlist_item, requested=url)
+
+    async def _fetch_direct(self, url: str, playlist_item: bool = False,
+                            cancel: Optional[threading.Event] = None) -> MediaOrPlaylist:
+        # على الحلقة: تنزيل متدفّق؛ الفهرس والقرص والـ probe فقط فى thread
+        rec = await asyncio.to_thread(self.index.lookup, url)
+        if rec is not None and os.path.exists(rec["path"]):
+            path, validators = Path(rec["path"]), rec      # سجلّ منتهى → طلب شرطى
+        else:
+            path = self._cache_path(self._direct_id(url),
+                                    Path(urlparse(url).path).suffix.lower().lstrip("."))
+            validators = None
+        try:
+            meta = await self.http.fetch(url, self.staging / path.name, validators, cancel)
+        except NotAudio:
+            return await asyncio.to_thread(self._fetch, url, playlist_item, cancel)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as exc:
+            self.logger.error(f"http error: {url}: {exc}")
+            raise RuntimeError("المقطع غير متاح أو محجوب")
+
+        if meta.get("not_modified"):
+            return await asyncio.to_thread(self._renew, rec["id"])
+        os.replace(self.staging / path.name, path)        # نشر ذرّى
+        return await asyncio.to_thread(
+            self._store, self._direct_id(url), path,
+            url=url, title=meta["title"], duration=None,
+            is_playlist=playlist_item, urls=(url,),
+            etag=meta.get("etag"), last_modified=meta.get("last_modified"))
+
+    def _expand(self, info: dict) -> List[Media]:
+        """عناصر قائمة تشغيل مسطّحة → مدخلات طابور خفيفة (بلا path)."""
+        items = []
+        for e in info.get("entries") or []:
+            if not e:
+                continue
+            url = e.get("url") or e.get("webpage_url")
+            if not url:
+                continue
+            items.append({
+                "url": url,
+                "title": e.get("title") or "—",
+                "duration": e.get("duration"),
+                "id": self._canonical_id(e),
+                "is_playlist_item": "1",
+            })
+        return items
+
+    def _postprocessor(self) -> dict:
+        if self.audio_format == "opus":
+            # إن كان المصدر Opus أصلًا (WebM) يكتفى yt-dlp بالنسخ إلى Ogg بلا ترميز
+            return {"key": "FFmpegExtractAudio", "preferredcodec": "opus"}
+        return {
+            "key": "FFmpegExtractAudio",
+            "preferredcodec": "mp3",
+            "preferredquality": "192",
+        }
+
+    def _extract(self, url: str, download: bool = True,
+                 cancel: Optional[threading.Event] = None) -> dict:
+        fmt = ("bestaudio[acodec=opus]/bestaudio/best"
+               if self.audio_format == "opus" else "bestaudio/best")
         ydl_opts = {
             "quiet": True,
-            "format": "bestaudio/best",
+            "format": fmt,
             "ffmpeg_location": self.ffmpeg_exe,
-            "outtmpl": str(self.dir / "%(id)s.%(ext)s"),
+            # = اسم _cache_path() داخل .tmp: يُنشر باسمه النهائى بنقل ذرّى واحد
+            "outtmpl": str(self.staging / "%(extractor_key)s-%(id)s.%(ext)s"),
             "cachedir": False,
-            "postprocessors": [
-                {
-                    "key": "FFmpegExtractAudio",
-                    "preferredcodec": "mp3",
-                    "preferredquality": "192",
-                }
-            ],
+            # لا تنزيل لعناصر القائمة هنا؛ تكفى البيانات الخفيفة
+            "extract_flat": "in_playlist",
+            "postprocessors": [self._postprocessor()],
         }
         try:
-            with YoutubeDL(ydl_opts) as ydl:
-                return ydl.extract_info(url, download=True)
-        except DownloadError as exc:
+            with metrics.EXTRACT_SECONDS.time(op="download" if download else "resolve"):
+                return self.backend.call(ytdl_worker.extract, canonical_url(url), ydl_opts,
+                                         download, cancel=cancel)
+        except ExtractError as exc:
             self.logger.error(f"yt-dlp error: {exc}", exc_info=True)
             raise RuntimeError("المقطع غير متاح أو محجوب")
 
     # ---- كاش ----
-    def _hash_name(self, url: str, suffix: str = ".mp3") -> Path:
-        h = hashlib.sha256(url.encode()).hexdigest()
-        return self.dir / f"{h}{suffix}"
+    def _cache_path(self, cid: str, ext: Optional[str] = None) -> Path:
+        """اسم الملف = المفتاح: «Youtube:abc» → Youtube-abc.opus"""
+        stem = re.sub(r"[^\w.-]", "_", cid.replace(":", "-", 1))
+        return self.dir / f"{stem}.{ext or self.audio_format}"
 
-    def _build_media(self, info: dict, *, is_playlist: bool) -> Media:
-        url  = info.get("original_url") or info.get("webpage_url")
-        path = self._hash_name(url)
+    def _from_cache(self, url: str) -> Optional[Media]:
+        rec = self.index.lookup(url)
+        if rec is None:
+            return None
+
+        ttl = self.PLAYLIST_TTL if rec.get("is_playlist_item") == "1" else self.SINGLE_TTL
+        if time.time() - rec["created"] > ttl.total_seconds():
+            return None
+        if not os.path.exists(rec["path"]):
+            self.index.remove(rec["id"])
+            return None
 
-        # إذا لم يكن موجودًا فى الكاش → انسخ/انقل إليه الملف الذى نزّلته yt-dlp
-        if not path.exists():
-            src = self._choose_audio_path(info)
-            os.replace(src, path)
+        self.index.touch(rec["id"])
+        return self._media(rec)
 
-        # تحديث mtime ليساعد وظيفة التنظيف على حساب العمر بدقة
-        os.utime(path, None)
+    def _renew(self, cid: str) -> Media:
+        # 304: نفس الملف صالح لمدّة TTL جديدة
+        self.index.update(cid, created=time.time())
+        self.index.touch(cid)
+        return self._media(self.index.get(cid))
 
+    @staticmethod
+    def _media(rec: dict) -> Media:
         return {
+            "url": rec["url"],
+            "title": rec["title"],
+            "path": rec["path"],
+            "id": rec["id"],
+            "duration": rec.get("duration"),
+            "bitrate": rec.get("bitrate"),
+            "codec": rec.get("codec"),
+            "is_playlist_item": rec["is_playlist_item"],
+        }
+
+    @staticmethod
+    def _canonical_id(info: dict) -> str:
+        ie = info.get("extractor_key") or info.get("ie_key") or info.get("extractor")
+        return f"{ie}:{info['id']}"
+
+    @staticmethod
+    def _direct_id(url: str) -> str:
+        return f"Http:{hashlib.sha256(normalize_url(url).encode()).hexdigest()[:16]}"
+
+    def _build_media(self, info: dict, *, is_playlist: bool,
+                     requested: Optional[str] = None) -> Media:
+        url  = info.get("original_url") or info.get("webpage_url")
+        cid  = self._canonical_id(info)
+        path = self._cache_path(cid)
+
+        # نشر ذرّى: من يشغّل النسخة السابقة يحتفظ بها حتى ينتهى
+        os.replace(self._choose_audio_path(info), path)
+
+        return self._store(cid, path,
+                           url=url, title=info.get("title") or "—",
+                           duration=info.get("duration"), is_playlist=is_playlist,
+                           urls=(url, requested, info.get("webpage_url")))
+
+    def _store(self, cid: str, path: Path, *, url: str, title: str,
+               duration: Optional[float], is_playlist: bool, urls, **extra) -> Media:
+        """تسجيل ملف مكتمل فى الفهرس (بعد قراءة بياناته مرّة واحدة)."""
+        meta = self._probe(path)
+        self.index.put(cid, {
             "url": url,
-            "title": info.get("title") or "—",
+            "title": title,
             "path": str(path),
-            # نستخدم امتداد اسم الملف للتمييز لاحقًا فى التنظيف
+            "duration": meta.get("duration") or duration,
+            "bitrate": meta.get("bitrate"),
+            "codec": meta.get("codec") or path.suffix.lstrip("."),
+            "size": path.stat().st_size,
+            # يحدّد مدّة صلاحيّة السجلّ (انظر _from_cache)
             "is_playlist_item": "1" if is_playlist else "0",
+            **extra,
+        }, urls=urls)
+        return self._media(self.index.get(cid))
+
+    # ---- الجهارة ----
+    def _queue_loudness(self, cid: str) -> None:
+        if not self.loudnorm:
+            return
+        if self._loud_q is None:
+            self._loud_q = asyncio.Queue()
+            self._loud_task = asyncio.get_running_loop().create_task(self._loudness_worker())
+        self._loud_q.put_nowait(cid)
+
+    async def _loudness_worker(self):
+        # عامل واحد: التحليل يستهلك CPU ولا داعى للاستعجال
+        while True:
+            cid = await self._loud_q.get()
+            rec = await asyncio.to_thread(self.index.get, cid)
+            if rec is None or "gain_db" in rec:
+                continue
+            if rec.get("codec") == "opus" and not self.loudnorm_copy:
+                continue                   # لن يُطبَّق: لا داعى لفكّ الملف كلّه
+            try:
+                await asyncio.to_thread(self._analyse, rec)
+            except Exception as exc:
+                self.logger.warning(f"[loudness] {cid}: {exc}")
+
+    def _analyse(self, rec: dict) -> None:
+        res = loudness.measure(self.ffmpeg_exe, rec["path"])
+        if res is None:
+            self.index.update(rec["id"], gain_db=0.0, loudness=None)
+            return
+        lufs, peak = res
+        gain = loudness.gain_for(lufs, peak, self.loudness_target)
+        # قراءة فقط: الملف لا يُلمس (لا جيل ترميز ثانٍ ولا سباق مع الإخلاء)
+        self.index.update(rec["id"], loudness=lufs, gain_db=gain)
+        self.logger.debug(f"[loudness] {rec['id']}: {lufs} LUFS → {gain:+.1f} dB")
+
+    def _probe(self, path: Path) -> dict:
+        """قراءة بيانات الملف (داخل thread التنزيل، مرّة واحدة لكل ملف)."""
+        import mutagen                        # يُستورد عند أوّل تنزيل لا عند الإقلاع
+        try:
+            f = mutagen.File(path)
+        except Exception as exc:
+            self.logger.warning(f"تعذّر قراءة بيانات {path.name}: {exc}")
+            return {}
+        if f is None:
+            return {}
+        length = getattr(f.info, "length", None)
+        bitrate = getattr(f.info, "bitrate", None)
+        if not bitrate and length:
+            bitrate = int(path.stat().st_size * 8 / length)
+        return {
+            "duration": round(length, 2) if length else None,
+            "bitrate": bitrate,
+            "codec": _CODECS.get(type(f).__name__),
         }
 
     def _choose_audio_path(self, info: dict) -> str:
@@ -99,22 +677,3 @@ class Downloader:
         if path:
             return path
         raise RuntimeError("تعذّر إيجاد الملف الصوتى بعد التنزيل")
-
-    # ---- تنظيف تلقائى ----
-    async def _cleanup(self):
-        while True:
-            now = datetime.utcnow()
-            for p in self.dir.iterdir():
-                if not p.is_file():
-                    continue
-
-                age = now - datetime.utcfromtimestamp(p.stat().st_mtime)
-
-                # نفرّق بين الملف الفردى والعنصر داخل قائمة تشغيل عبر metadata
-                ttl = self.PLAYLIST_TTL if ".pl" in p.stem else self.SINGLE_TTL
-                if age > ttl:
-                    try:
-                        p.unlink()
-                    except Exception:
-                        pass
-            await asyncio.sleep(24 * 3600)   # مرّة يوميًا
@@ -0,0 +1,118 @@
+# modules/embed_updater.py
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+import discord
+
+Render = Callable[[], Optional[discord.Embed]]
+
+
+@dataclass
+class _Target:
+    msg:       discord.Message
+    render:    Render
+    due:       float
+    last:      str = ""
+
+
+class EmbedUpdater:
+    """
+    مُحدِّث مركزى لرسائل «يُشغَّل الآن» بدل مهمّة لكل سيرفر:
+    • مهمّة واحدة تمرّ على السيرفرات المستحقّة وتوزّع التعديلات زمنيًا (jitter)
+    • سقف عام لعدد التعديلات فى الثانية
+    • فاصل تحديث يتكيّف: يتباطأ عند 429 أو عند تأخّر الاستجابة (انتظار bucket)
+      ويعود تدريجيًا إلى الحدّ الأدنى حين تكون الطلبات سريعة
+    • لا تعديل إن لم يتغيّر النص المعروض (مثلاً أثناء الإيقاف المؤقت)
+    """
+    TICK = 0.5
+
+    def __init__(self, logger, min_interval: float = 10.0, max_interval: float = 60.0,
+                 max_rate: float = 2.0) -> None:
+        self.logger = logger
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.max_rate = max_rate               # تعديلات/ثانية لكل العملية
+        self.interval = min_interval
+        self._targets: Dict[int, _Target] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.edits = 0
+        self.skipped = 0
+
+    # ---------- واجهة عامّة ---------- #
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        if self._task:
+            self._task.cancel()
+
+    def register(self, gid: int, msg: discord.Message, render: Render) -> None:
+        """تسجيل (أو استبدال) رسالة السيرفر؛ أوّل تحديث بعد فاصل عشوائى."""
+        prev = self._targets.get(gid)
+        self._targets[gid] = _Target(
+            msg, render,
+            due=time.monotonic() + random.uniform(0.5, 1.0) * self.interval,
+            last=prev.last if prev and prev.msg.id == msg.id else "",
+        )
+
+    def unregister(self, gid: int) -> None:
+        self._targets.pop(gid, None)
+
+    # ---------- داخلى ---------- #
+    async def _run(self) -> None:
+        budget = 0.0
+        while True:
+            await asyncio.sleep(self.TICK)
+            budget = min(budget + self.max_rate * self.TICK, self.max_rate)
+            now = time.monotonic()
+            due = sorted((t.due, gid) for gid, t in self._targets.items() if t.due <= now)
+            for _, gid in due:
+                if budget < 1:
+                    break
+                tgt = self._targets.get(gid)
+                if tgt is None:
+                    continue
+                tgt.due = now + self.interval * random.uniform(0.9, 1.1)
+                try:
+                    if await self._edit(gid, tgt):
+                        budget -= 1
+                except Exception as exc:
+                    self.logger.warning(f"[embed] {gid}: {exc}")
+
+    async def _edit(self, gid: int, tgt: _Target) -> bool:
+        emb = tgt.render()
+        if emb is None:
+            return False
+        text = json.dumps(emb.to_dict(), sort_keys=True, ensure_ascii=False)
+        if text == tgt.last:
+            self.skipped += 1
+            return False
+
+        t0 = time.monotonic()
+        try:
+            await tgt.msg.edit(embed=emb)
+        except discord.NotFound:
+            self.unregister(gid)
+            return False
+        except discord.HTTPException as exc:
+            if exc.status == 429:
+                self._slow_down()
+            raise
+        tgt.last = text
+        self.edits += 1
+
+        # discord.py ينتظر داخليًا عند امتلاء الـ bucket → زمن الاستجابة مؤشّر كافٍ
+        if time.monotonic() - t0 > 1.0:
+            self._slow_down()
+        else:
+            self.interval = max(self.min_interval, self.interval * 0.95)
+        return True
+
+    def _slow_down(self) -> None:
+        self.interval = min(self.max_interval, self.interval * 1.5)
+        self.logger.info(f"[embed] rate-limited → interval {self.interval:.1f}s")
@@ -0,0 +1,12 @@
+# modules/ffmpeg.py
+from functools import lru_cache
+
+
+@lru_cache(maxsize=None)
+def ffmpeg_exe() -> str:
+    """
+    مسار ffmpeg لكل العمليّة، يُحسب مرّة واحدة عند أوّل طلب
+    (imageio_ffmpeg نفسه لا يُستورد قبل ذلك؛ IMAGEIO_FFMPEG_EXE يحدّد مسارًا بعينه).
+    """
+    from imageio_ffmpeg import get_ffmpeg_exe
+    return get_ffmpeg_exe()
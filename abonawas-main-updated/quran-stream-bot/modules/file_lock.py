@@ -0,0 +1,83 @@
+# modules/file_lock.py
+"""
+أقفال استشاريّة (fcntl.flock) تجعل مجلّد الكاش آمنًا بين عدّة عمليّات
+(shards أو نشر متدرّج على نفس الـ volume):
+• KeyLocks: قفل حصرى لكل مفتاح أثناء تنزيله → تنزيل واحد للمقطع عبر كل العمليّات
+• Lease: قفل مشترك على ملف أثناء تشغيله
+• try_exclusive: الإخلاء لا يحذف ملفًا يحمل أى عمليّة عليه Lease
+الأقفال تُحرَّر تلقائيًا إن ماتت العمليّة.
+"""
+import fcntl
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+
+class Lease:
+    """قفل مشترك على ملف مُشغَّل؛ يبقى حتى close()."""
+    __slots__ = ("path", "_fd")
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._fd: Optional[int] = os.open(path, os.O_RDONLY)
+        fcntl.flock(self._fd, fcntl.LOCK_SH)
+
+    def close(self) -> None:
+        if self._fd is not None:
+            os.close(self._fd)          # إغلاق الواصف يحرّر القفل
+            self._fd = None
+
+
+def try_exclusive(path: str) -> Optional[int]:
+    """واصف مقفل حصريًا، أو None إن كان الملف قيد التشغيل (أو غير موجود)."""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+class KeyLocks:
+    """ملف قفل صغير لكل مفتاح داخل <dir>/.locks (لا يُحذف: حذفه يفتح سباقًا)."""
+    POLL = 0.2
+
+    def __init__(self, directory: Path) -> None:
+        self.dir = directory / ".locks"
+        self.dir.mkdir(exist_ok=True)
+
+    def _path(self, key: str) -> Path:
+        return self.dir / f"{hashlib.sha1(key.encode()).hexdigest()[:20]}.lock"
+
+    def acquire(self, key: str, cancel: Optional[threading.Event] = None) -> int:
+        """انتظار القفل (داخل thread)؛ RuntimeError إن أُلغى الطلب أثناء الانتظار."""
+        fd = os.open(self._path(key), os.O_RDWR | os.O_CREAT, 0o644)
+        while True:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                return fd
+            except BlockingIOError:
+                if cancel is not None and cancel.is_set():
+                    os.close(fd)
+                    raise RuntimeError("أُلغى التحميل")
+                time.sleep(self.POLL)
+
+    def try_acquire(self, key: str) -> Optional[int]:
+        fd = os.open(self._path(key), os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        return fd
+
+    @staticmethod
+    def release(fd: int) -> None:
+        os.close(fd)
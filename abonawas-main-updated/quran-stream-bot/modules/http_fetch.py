@@ -0,0 +1,169 @@
+# modules/http_fetch.py
+import asyncio
+import json
+import os
+import re
+import threading
+from pathlib import Path
+from typing import Dict, Optional
+from urllib.parse import unquote, urlparse
+
+import aiohttp
+
+# امتدادات تُجرَّب مباشرة عبر HTTP قبل yt-dlp
+AUDIO_EXTS = {".mp3", ".ogg", ".opus", ".m4a", ".aac", ".wav", ".flac", ".webm"}
+_RX_FILENAME = re.compile(r'filename\*?=(?:UTF-8\'\')?"?([^";]+)"?', re.I)
+
+
+class NotAudio(Exception):
+    """الرابط لا يُرجع محتوى صوتيًا → يُحال إلى yt-dlp."""
+
+
+class HttpFetcher:
+    """
+    مسار سريع للروابط الصوتية المباشرة (mp3quran وأمثالها):
+    • جلسة aiohttp واحدة مشتركة بمجمّع اتصالات (keep-alive + DNS cache)
+    • تنزيل متدفّق على دفعات إلى ملف .part ثم نقل ذرّى
+    • استكمال التنزيل المنقطع بـ Range/If-Range: أدوات تحقّق الاستجابة التى بدأت
+      الـ .part تُحفظ بجانبه (.part.json)، وبدونها يُعاد التنزيل من البداية
+    • إعادة تحقّق شرطيّة (ETag / Last-Modified) → 304 بلا أى تنزيل
+    """
+    CHUNK = 64 * 1024
+    FLUSH = 1024 * 1024            # الكتابة للقرص فى thread كل 1MB
+
+    def __init__(self, limit: int = 32, limit_per_host: int = 8) -> None:
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    @staticmethod
+    def is_candidate(url: str) -> bool:
+        return Path(urlparse(url).path).suffix.lower() in AUDIO_EXTS
+
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.limit,
+                                               limit_per_host=self.limit_per_host,
+                                               ttl_dns_cache=300),
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=60),
+            )
+        return self._session
+
+    async def close(self) -> None:
+        if self._session is not None:
+            await self._session.close()
+
+    # ---------- واجهة عامّة ---------- #
+    async def probe(self, url: str) -> Dict[str, object]:
+        """HEAD: نوع المحتوى والحجم وأدوات التحقّق؛ NotAudio إن لم يكن صوتًا."""
+        async with self.session.head(url, allow_redirects=True) as resp:
+            resp.raise_for_status()
+            return self._meta(url, resp)
+
+    async def fetch(self, url: str, dest: Path, validators: Optional[Dict] = None,
+                    cancel: Optional[threading.Event] = None) -> Dict[str, object]:
+        """
+        تنزيل url إلى dest. يُرجع بيانات الاستجابة، أو {"not_modified": True}
+        إن طابقت أدوات التحقّق النسخة الموجودة.
+        """
+        part = dest.with_name(dest.name + ".part")
+        stamp = dest.with_name(dest.name + ".part.json")
+        headers = {}
+        if validators:                     # يمرّرها المستدعى فقط إن كانت لديه نسخة
+            if validators.get("etag"):
+                headers["If-None-Match"] = validators["etag"]
+            if validators.get("last_modified"):
+                headers["If-Modified-Since"] = validators["last_modified"]
+
+        offset = part.stat().st_size if part.exists() else 0
+        if offset:
+            # بلا If-Range قد يُلصق محتوى جديد تغيّر على الخادم ببايتات النسخة القديمة
+            if_range = await asyncio.to_thread(self._if_range, stamp)
+            if if_range:
+                headers["Range"] = f"bytes={offset}-"
+                headers["If-Range"] = if_range
+            else:
+                offset = 0
+
+        async with self.session.get(url, headers=headers) as resp:
+            if resp.status == 304:
+                return {"not_modified": True}
+            if resp.status == 416 and offset:
+                restart = True                   # .part مكتمل أو أطول من الملف الحالى
+            else:
+                restart = False
+                resp.raise_for_status()
+                meta = self._meta(url, resp)
+                if resp.status != 206:           # الخادم تجاهل Range أو تغيّر الملف
+                    offset = 0
+                    await asyncio.to_thread(self._save_stamp, stamp, meta)
+                await self._stream(resp, part, offset, cancel)
+
+        if restart:
+            # من البايت 0 (لا .part بعد الآن → لا Range ولا 416 مرّة أخرى)
+            part.unlink(missing_ok=True)
+            stamp.unlink(missing_ok=True)
+            return await self.fetch(url, dest, validators, cancel)
+        os.replace(part, dest)
+        stamp.unlink(missing_ok=True)
+        meta["size"] = dest.stat().st_size
+        return meta
+
+    # ---------- داخلى ---------- #
+    async def _stream(self, resp: aiohttp.ClientResponse, part: Path, offset: int,
+                      cancel: Optional[threading.Event]) -> None:
+        f = await asyncio.to_thread(open, part, "ab" if offset else "wb")
+        try:
+            buf = bytearray()
+            async for chunk in resp.content.iter_chunked(self.CHUNK):
+                if cancel is not None and cancel.is_set():
+                    raise asyncio.CancelledError()
+                buf += chunk
+                if len(buf) >= self.FLUSH:
+                    await asyncio.to_thread(f.write, bytes(buf))
+                    buf.clear()
+            if buf:
+                await asyncio.to_thread(f.write, bytes(buf))
+        finally:
+            await asyncio.to_thread(f.close)
+
+    @staticmethod
+    def _save_stamp(stamp: Path, meta: Dict[str, object]) -> None:
+        """أدوات تحقّق النسخة التى تُكتب فى .part (لا شىء يُحفظ إن لم يرسلها الخادم)."""
+        if meta.get("etag") or meta.get("last_modified"):
+            stamp.write_text(json.dumps({"etag": meta.get("etag"),
+                                         "last_modified": meta.get("last_modified")}))
+        else:
+            stamp.unlink(missing_ok=True)
+
+    @staticmethod
+    def _if_range(stamp: Path) -> Optional[str]:
+        try:
+            saved = json.loads(stamp.read_text())
+        except (OSError, ValueError):
+            return None
+        etag = saved.get("etag")
+        # If-Range لا يقبل ETag ضعيفًا (W/…)
+        if etag and not etag.startswith("W/"):
+            return etag
+        return saved.get("last_modified")
+
+    @staticmethod
+    def _meta(url: str, resp: aiohttp.ClientResponse) -> Dict[str, object]:
+        ctype = resp.headers.get("Content-Type", "").split(";")[0].strip().lower()
+        if not (ctype.startswith("audio/") or ctype in ("application/ogg", "video/webm")):
+            raise NotAudio(ctype)
+
+        title = None
+        m = _RX_FILENAME.search(resp.headers.get("Content-Disposition", ""))
+        if m:
+            title = unquote(m.group(1))
+        title = Path(title or unquote(urlparse(url).path)).stem or "—"
+        return {
+            "content_type": ctype,
+            "title": title,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+        }
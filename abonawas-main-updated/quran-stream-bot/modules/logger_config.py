@@ -1,33 +1,162 @@
+import atexit
+import contextvars
+import json
 import logging
 import os
+import queue
 import sys
-import traceback
-from logging.handlers import RotatingFileHandler
+import threading
+import time
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from typing import Dict, Optional, Tuple
 
 # تم حذف import requests و Webhook handler
 
-def setup_logger(name: str = "quran_bot") -> logging.Logger:
-    log = logging.getLogger(name)
-    if log.handlers:  # منع الازدواج عند الاستيراد المتكرّر
-        return log
+# LOG_QUEUE=1: الكتابة (stdout + ملف دوّار) فى thread خلفى، لا على حلقة الأحداث
+# LOG_FORMAT=json: سطر JSON لكل سجلّ مع guild_id و interaction_id
+_QUEUED = os.getenv("LOG_QUEUE", "1") == "1"
+_FORMAT = os.getenv("LOG_FORMAT", "text")
+# الأخطاء المتكرّرة: أوّل LOG_BURST فى كل LOG_WINDOW ثانية، والباقى يُعدّ فقط
+_BURST  = int(os.getenv("LOG_BURST", "5"))
+_WINDOW = float(os.getenv("LOG_WINDOW", "60"))
+
+guild_id_var: contextvars.ContextVar[Optional[int]] = \
+    contextvars.ContextVar("guild_id", default=None)
+interaction_id_var: contextvars.ContextVar[Optional[int]] = \
+    contextvars.ContextVar("interaction_id", default=None)
+
+_sinks: Optional[list] = None
+_queue: Optional[queue.SimpleQueue] = None
+_listener: Optional[QueueListener] = None
+_lock = threading.Lock()
+
+
+def log_context(interaction) -> None:
+    """ربط السجلّات التالية فى هذه المهمّة (وما تنشئه من مهام) بالتفاعل."""
+    guild_id_var.set(getattr(interaction, "guild_id", None))
+    interaction_id_var.set(getattr(interaction, "id", None))
+
+
+class _ContextFilter(logging.Filter):
+    # يعمل فى thread المستدعى: contextvars متاحة هنا فقط
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.guild_id = guild_id_var.get()
+        record.interaction_id = interaction_id_var.get()
+        return True
+
+
+class _RateLimitFilter(logging.Filter):
+    """
+    WARNING فأعلى: نفس موضع الاستدعاء (الملف + السطر + نوع الاستثناء) يُمرَّر LOG_BURST
+    مرّة لكل نافذة. الرسائل f-string تختلف نصًّا لكل رابط/خطأ، فالمفتاح هو مصدرها لا نصّها.
+    """
+    def __init__(self, burst: int = _BURST, window: float = _WINDOW) -> None:
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self._seen: Dict[Tuple, list] = {}      # key → [بداية النافذة، العدد، المكتوم]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.WARNING:
+            return True
+        exc = record.exc_info[0].__name__ if record.exc_info and record.exc_info[0] else None
+        key = (record.pathname, record.lineno, record.levelno, exc)
+        now = time.monotonic()
+        with self._lock:
+            slot = self._seen.get(key)
+            if slot is None or now - slot[0] >= self.window:
+                suppressed = slot[2] if slot else 0
+                self._seen[key] = [now, 1, 0]
+                if len(self._seen) > 1024:       # مفاتيح قديمة
+                    self._seen = {k: v for k, v in self._seen.items()
+                                  if now - v[0] < self.window}
+                if suppressed:
+                    record.msg = f"{record.msg} (+{suppressed} مكرّرة كُتمت)"
+                return True
+            slot[1] += 1
+            if slot[1] <= self.burst:
+                return True
+            slot[2] += 1
+            return False
 
-    log.setLevel(logging.INFO)
 
-    formatter = logging.Formatter(
-        "%(asctime)s | %(levelname)-8s | %(name)s | %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
-    )
+class _JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "guild_id": getattr(record, "guild_id", None),
+            "interaction_id": getattr(record, "interaction_id", None),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False)
+
+
+class _QueueHandler(QueueHandler):
+    """
+    يُجهّز السجلّ للنقل دون تنسيقه بالكامل: الرسالة تُدمج والاستثناء يصير نصًّا،
+    ويبقى التنسيق النهائى (نص / JSON) للـ listener.
+    """
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def _make_sinks() -> list:
+    if _FORMAT == "json":
+        formatter: logging.Formatter = _JsonFormatter()
+    else:
+        formatter = logging.Formatter(
+            "%(asctime)s | %(levelname)-8s | %(name)s | %(message)s",
+            datefmt="%Y-%m-%d %H:%M:%S",
+        )
 
     # ---- stdout ----
     sh = logging.StreamHandler(sys.stdout)
     sh.setFormatter(formatter)
-    log.addHandler(sh)
 
     # ---- ملف دوّار (5 MB × 3) ----
     fh = RotatingFileHandler("bot.log", maxBytes=5_000_000, backupCount=3, encoding="utf-8")
     fh.setFormatter(formatter)
-    log.addHandler(fh)
+    return [sh, fh]
+
+
+def _handlers() -> list:
+    """مخارج مشتركة لكل المسجّلات (ملف bot.log واحد، listener واحد للعمليّة)."""
+    global _sinks, _queue, _listener
+    with _lock:
+        if _sinks is None:
+            _sinks = _make_sinks()
+            if _QUEUED:
+                _queue = queue.SimpleQueue()
+                _listener = QueueListener(_queue, *_sinks, respect_handler_level=True)
+                _listener.start()
+                atexit.register(_listener.stop)      # تفريغ ما تبقّى عند الخروج
+    if _QUEUED:
+        return [_QueueHandler(_queue)]
+    return list(_sinks)
+
 
+def setup_logger(name: str = "quran_bot") -> logging.Logger:
+    log = logging.getLogger(name)
+    if log.handlers:  # منع الازدواج عند الاستيراد المتكرّر
+        return log
+
+    log.setLevel(logging.INFO)
+    log.addFilter(_ContextFilter())
+    log.addFilter(_RateLimitFilter())
+    for h in _handlers():
+        log.addHandler(h)
     return log
 
 # WebhookHandler تم حذفه كليًا
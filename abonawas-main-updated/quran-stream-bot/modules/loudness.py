@@ -0,0 +1,39 @@
+# modules/loudness.py
+"""
+قياس الجهارة (EBU R128) مرّة واحدة لكل ملف فى الكاش وحساب كسب ثابت يُطبَّق
+عند التشغيل (فلتر volume بسيط)، بدل فلتر loudnorm اللحظى الذى يضاعف كلفة كل بثّ.
+الملف نفسه لا يُعاد ترميزه: نسخة الكاش تبقى كما نُزّلت. ملفات Opus تُشغَّل
+stream copy بلا كسب افتراضيًا (الكسب يعنى ترميزًا فى كل تشغيل)؛ LOUDNORM_COPY=1 يفرضه.
+"""
+import re
+import subprocess
+from typing import Optional, Tuple
+
+_RX_I    = re.compile(r"I:\s+(-?\d+(?:\.\d+)?) LUFS")
+_RX_PEAK = re.compile(r"Peak:\s+(-?\d+(?:\.\d+)?) dBFS")
+
+MAX_GAIN  = 12.0     # dB
+PEAK_CEIL = -1.0     # dBTP: لا رفع يتجاوز هذا الحدّ (تجنّب التشبّع)
+
+
+def measure(ffmpeg_exe: str, path: str) -> Optional[Tuple[float, float]]:
+    """(الجهارة المتكاملة LUFS، أعلى قمّة dBFS) أو None عند الفشل/الصمت."""
+    proc = subprocess.run(
+        [ffmpeg_exe, "-nostdin", "-hide_banner", "-i", path,
+         "-af", "ebur128=peak=true:framelog=quiet", "-f", "null", "-"],
+        capture_output=True, text=True, errors="replace",
+    )
+    # الملخّص فى آخر المخرجات؛ نأخذ آخر تطابق
+    i, peak = _RX_I.findall(proc.stderr), _RX_PEAK.findall(proc.stderr)
+    if proc.returncode != 0 or not i or not peak:
+        return None
+    lufs = float(i[-1])
+    if lufs <= -70:          # صمت
+        return None
+    return lufs, float(peak[-1])
+
+
+def gain_for(lufs: float, peak: float, target: float) -> float:
+    gain = target - lufs
+    gain = min(gain, PEAK_CEIL - peak)
+    return round(max(-MAX_GAIN, min(MAX_GAIN, gain)), 2)
@@ -0,0 +1,252 @@
+# modules/metrics.py
+"""
+مقاييس داخليّة بصيغة Prometheus النصّيّة (بلا اعتماديّات إضافيّة):
+• Counter / Gauge / Histogram آمنة للاستدعاء من أى thread (خيوط الصوت والتنزيل)
+• المقاييس المشتقّة من حالة قائمة (حجم الكاش، عدد العملاء…) تُحسب عند الطلب عبر fn
+• MetricsServer: نقطة /metrics على aiohttp + مسبار تأخّر حلقة الأحداث؛ الصفحة تُبنى
+  فى thread (مسح /proc واستعلامات الفهرس لا توقف الحلقة)، فدوال fn لا تلمس
+  إلا ما يُقرأ بأمان من خارجها
+"""
+import asyncio
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, Optional, Sequence, Tuple
+
+LabelKey = Tuple[str, ...]
+Fn = Callable[[], object]          # رقم، أو {قيم التسميات (tuple): رقم}
+
+PREFIX = "quranbot_"
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(v: object) -> str:
+    return str(v).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _labels(names: Sequence[str], values: LabelKey, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _num(v: float) -> str:
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 fn: Optional[Fn] = None) -> None:
+        self.name = PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self.fn = fn
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object]) -> LabelKey:
+        return tuple(str(labels.get(n, "")) for n in self.labelnames)
+
+    def _samples(self) -> Iterator[Tuple[LabelKey, float]]:
+        if self.fn is not None:
+            v = self.fn()
+            if isinstance(v, dict):
+                yield from ((k if isinstance(k, tuple) else (k,), x) for k, x in v.items())
+            else:
+                yield (), v
+            return
+        with self._lock:
+            yield from list(self._values.items())
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines += [f"{self.name}{_labels(self.labelnames, k)} {_num(v)}"
+                  for k, v in self._samples()]
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS) -> None:
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        self._series: Dict[LabelKey, list] = {}     # key → [عدّادات الدلاء…, sum, count]
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - t0, **labels)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: list(v) for k, v in self._series.items()}
+        for key, s in series.items():
+            acc = 0
+            for le, n in zip(self.buckets, s):
+                acc += n
+                le_label = 'le="%s"' % _num(le)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le_label)} {acc}")
+            inf_label = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, inf_label)} {s[-1]}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_num(s[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {s[-1]}")
+        return "\n".join(lines)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        # نفس الاسم يستبدل السابق (إعادة تحميل cog تعيد ربط الدوال بالنسخة الجديدة)
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        out = []
+        for m in list(self._metrics.values()):
+            try:
+                out.append(m.render())
+            except Exception:          # مقياس معطوب لا يُسقط الصفحة كلها
+                continue
+        return "\n".join(out) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def counter(name: str, help: str, labels: Sequence[str] = (), fn: Optional[Fn] = None) -> Counter:
+    return REGISTRY.register(Counter(name, help, labels, fn))
+
+
+def gauge(name: str, help: str, labels: Sequence[str] = (), fn: Optional[Fn] = None) -> Gauge:
+    return REGISTRY.register(Gauge(name, help, labels, fn))
+
+
+def histogram(name: str, help: str, labels: Sequence[str] = (),
+              buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return REGISTRY.register(Histogram(name, help, labels, buckets))
+
+
+# ---------- مقاييس المسارات الساخنة ---------- #
+DOWNLOAD_SECONDS = histogram("download_seconds", "زمن تنزيل مقطع إلى الكاش", ("path",))
+EXTRACT_SECONDS  = histogram("extract_seconds", "زمن استدعاء yt-dlp", ("op",))
+CACHE_REQUESTS   = counter("cache_requests_total", "طلبات الكاش حسب النتيجة", ("result",))
+TTFA_SECONDS     = histogram("time_to_first_audio_seconds",
+                             "من الأمر حتى أوّل حزمة صوت", ("mode",))
+GAP_SECONDS      = histogram("track_gap_seconds", "الفجوة بين نهاية مقطع وبداية التالى",
+                             buckets=(0.001, 0.005, 0.02, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5))
+LOOP_LAG_SECONDS = histogram("event_loop_lag_seconds", "تأخّر استيقاظ حلقة الأحداث",
+                             buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1))
+DB_WRITE_SECONDS = histogram("playlist_db_write_seconds", "زمن كتابة واحدة فى playlists.db",
+                             buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1))
+
+
+# ---------- مقاييس العمليّة ---------- #
+def _ffmpeg_children() -> int:
+    """عمليّات ffmpeg الأبناء (Linux: /proc)؛ 0 إن تعذّر القياس."""
+    me, n = str(os.getpid()), 0
+    try:
+        pids = [p for p in os.listdir("/proc") if p.isdigit()]
+    except OSError:
+        return 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat", "rb") as f:
+                stat = f.read().decode(errors="replace")
+        except OSError:
+            continue
+        comm = stat[stat.find("(") + 1:stat.rfind(")")]
+        ppid = stat[stat.rfind(")") + 2:].split()[1]
+        if ppid == me and "ffmpeg" in comm:
+            n += 1
+    return n
+
+
+def _rss_bytes() -> int:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        return 0
+
+
+gauge("ffmpeg_processes", "عمليّات ffmpeg الجارية", fn=_ffmpeg_children)
+gauge("resident_memory_bytes", "ذاكرة العمليّة المقيمة (RSS)", fn=_rss_bytes)
+
+
+class MetricsServer:
+    """GET /metrics على aiohttp + مسبار تأخّر حلقة الأحداث."""
+    def __init__(self, host: str, port: int, lag_interval: float = 0.5) -> None:
+        self.host = host
+        self.port = port
+        self.lag_interval = lag_interval
+        self._runner = None
+        self._probe: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        from aiohttp import web               # aiohttp.web لا يُحمَّل ما لم تُفعَّل النقطة
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        self._probe = asyncio.get_running_loop().create_task(self._lag_probe())
+
+    async def stop(self) -> None:
+        if self._probe:
+            self._probe.cancel()
+        if self._runner:
+            await self._runner.cleanup()
+
+    @staticmethod
+    async def _handle(_request):
+        from aiohttp import web
+        text = await asyncio.to_thread(REGISTRY.render)
+        return web.Response(text=text, content_type="text/plain", charset="utf-8")
+
+    async def _lag_probe(self) -> None:
+        while True:
+            t = time.perf_counter()
+            await asyncio.sleep(self.lag_interval)
+            LOOP_LAG_SECONDS.observe(max(0.0, time.perf_counter() - t - self.lag_interval))
@@ -1,47 +1,214 @@
 # modules/playlist_store.py
 import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
 
-_STORE = Path("playlists.json")
+from modules import metrics
+from modules.logger_config import setup_logger
+
+_DB    = Path("playlists.db")
+_STORE = Path("playlists.json")       # الصيغة القديمة (تُرحَّل مرّة واحدة)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS playlists (
+    id    INTEGER PRIMARY KEY,
+    guild TEXT NOT NULL,
+    name  TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    UNIQUE (guild, name)
+);
+CREATE INDEX IF NOT EXISTS idx_playlists_owner ON playlists (owner);
+CREATE TABLE IF NOT EXISTS tracks (
+    playlist_id INTEGER NOT NULL REFERENCES playlists (id) ON DELETE CASCADE,
+    pos         INTEGER NOT NULL,
+    url         TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_tracks_playlist ON tracks (playlist_id, pos);
+"""
+
+# ترقيات المخطّط: العنصر i يرفع PRAGMA user_version من i إلى i+1
+_MIGRATIONS = [
+    # 1: بيانات المقطع المحلولة تُحفظ مع الرابط (عرض فورى للقائمة عند تشغيلها)
+    """
+    ALTER TABLE tracks ADD COLUMN title TEXT;
+    ALTER TABLE tracks ADD COLUMN duration REAL;
+    ALTER TABLE tracks ADD COLUMN cid TEXT;
+    CREATE INDEX IF NOT EXISTS idx_tracks_url ON tracks (url);
+    """,
+]
+
+Track = Dict[str, object]              # {"url", "title"?, "duration"?, "id"?}
+
+_PID = "(SELECT id FROM playlists WHERE guild = ? AND name = ?)"
 
 
 class PlaylistStore:
     """
     • قائمة التشغيل محفوظة داخل السيرفر (guild) الذى أُنشِئت فيه لكل الأعضاء.
     • المالك (owner_id) يرى قوائمه فى أى سيرفر آخر.
+    • التخزين: SQLite (WAL) مع فهارس على (guild, name) وعلى owner.
+    • القراءة من نسخة فى الذاكرة مفهرسة بالسيرفر وبالمالك (بلا مسح لكل السيرفرات)،
+      والكتابة تُنفَّذ بالترتيب فى thread واحد خارج حلقة الأحداث.
+    • كل مقطع يحمل عنوانه ومدّته ومعرّفه فى الكاش متى عُرفت (set_meta).
     """
-    def __init__(self) -> None:
-        # guild_id(str) -> { name(str): {"owner": user_id(str), "urls": [str,…]} }
-        self._data: Dict[str, Dict[str, Dict[str, object]]] = (
-            json.loads(_STORE.read_text(encoding="utf-8"))
-            if _STORE.exists() else {}
-        )
+    def __init__(self, db_path: Path = _DB, logger: Optional[logging.Logger] = None) -> None:
+        self.logger = logger or setup_logger(__name__)
+        # guild_id(str) -> { name(str): {"owner": user_id(str), "tracks": [Track,…]} }
+        self._data: Dict[str, Dict[str, Dict[str, object]]] = {}
+        # owner_id(str) -> {(guild_id, name), …}
+        self._owned: Dict[str, Set[Tuple[str, str]]] = {}
+        # url -> كل نسخ المقطع فى القوائم (لتحديث بياناتها معًا)
+        self._by_url: Dict[str, List[Track]] = {}
+        # fn(url, track) حين يُعرف عنوان مقطع محفوظ، fn(url, None) حين يزول من كل القوائم
+        self._listeners: List[Callable[[str, Optional[Track]], None]] = []
+
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(_SCHEMA)
+        self._migrate_schema()
+        self._migrate_json()
+        self._load()
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="playlist-db")
+        # كل عدّاد يكتبه thread واحد فقط (الحلقة / الكاتب)
+        self._submitted = self._written = 0
+        metrics.gauge("playlist_db_pending_writes", "كتابات معلّقة فى طابور playlists.db",
+                      fn=lambda: self._submitted - self._written)
 
     # ---------- أدوات داخليّة ---------- #
-    def _flush(self) -> None:
-        _STORE.write_text(json.dumps(self._data, ensure_ascii=False, indent=2),
-                          encoding="utf-8")
+    def _migrate_schema(self) -> None:
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        for v, script in enumerate(_MIGRATIONS[version:], start=version + 1):
+            self._db.executescript(f"BEGIN; {script} PRAGMA user_version = {v}; COMMIT;")
+
+    def _migrate_json(self) -> None:
+        if not _STORE.exists():
+            return
+        if self._db.execute("SELECT 1 FROM playlists LIMIT 1").fetchone():
+            return
+        data = json.loads(_STORE.read_text(encoding="utf-8"))
+        with self._db:
+            for gid, lists in data.items():
+                for name, rec in lists.items():
+                    cur = self._db.execute(
+                        "INSERT INTO playlists (guild, name, owner) VALUES (?, ?, ?)",
+                        (gid, name, rec["owner"]))
+                    self._db.executemany(
+                        "INSERT INTO tracks (playlist_id, pos, url) VALUES (?, ?, ?)",
+                        [(cur.lastrowid, i, u) for i, u in enumerate(rec["urls"])])
+        _STORE.rename(_STORE.with_suffix(".json.migrated"))
+
+    def _load(self) -> None:
+        ids = {}
+        for pid, gid, name, owner in self._db.execute(
+                "SELECT id, guild, name, owner FROM playlists"):
+            rec = {"owner": owner, "tracks": []}
+            self._data.setdefault(gid, {})[name] = rec
+            self._owned.setdefault(owner, set()).add((gid, name))
+            ids[pid] = rec
+        for pid, url, title, duration, cid in self._db.execute(
+                "SELECT playlist_id, url, title, duration, cid FROM tracks "
+                "ORDER BY playlist_id, pos"):
+            t = {"url": url}
+            if title:
+                t.update(title=title, duration=duration, id=cid)
+            self._append(ids[pid], t)
+
+    def _append(self, rec: Dict, track: Track) -> None:
+        rec["tracks"].append(track)
+        self._by_url.setdefault(track["url"], []).append(track)
+        if track.get("title"):
+            self._notify(track["url"], track)
+
+    def _forget(self, tracks: List[Track]) -> None:
+        for t in tracks:
+            same = self._by_url.get(t["url"], [])
+            same[:] = [x for x in same if x is not t]
+            if not same and self._by_url.pop(t["url"], None) is not None:
+                self._notify(t["url"], None)
+
+    def _notify(self, url: str, track: Optional[Track]) -> None:
+        for fn in self._listeners:
+            fn(url, track)
+
+    def _write(self, sql: str, *params) -> None:
+        self._transaction((sql, params))
+
+    def _transaction(self, *statements: Tuple[str, tuple]) -> None:
+        """عدّة جمل فى معاملة واحدة (كلّها أو لا شىء) على thread الكاتب."""
+        def _run():
+            t0 = time.perf_counter()
+            try:
+                with self._db:
+                    for sql, params in statements:
+                        self._db.execute(sql, params)
+            finally:
+                self._written += 1
+                metrics.DB_WRITE_SECONDS.observe(time.perf_counter() - t0)
+
+        def _check(fut: Future) -> None:
+            # النسخة فى الذاكرة تحمل التغيير بالفعل → الفشل يُسجَّل وإلا اختلفتا بصمت
+            exc = fut.exception()
+            if exc is not None:
+                self.logger.error(f"[playlists.db] فشلت الكتابة: "
+                                  f"{statements[0][0].split()[0]}…: {exc}", exc_info=exc)
+        self._submitted += 1
+        self._writer.submit(_run).add_done_callback(_check)
 
     def _get_record(self, guild_id: int, name: str) -> Optional[Dict]:
         return self._data.get(str(guild_id), {}).get(name)
 
+    def add_listener(self, fn: Callable[[str, Optional[Track]], None]) -> None:
+        """تغيّرات المقاطع معروفة العنوان (لفهرس البحث المحلى)؛ تُستدعى على الحلقة."""
+        self._listeners.append(fn)
+
+    def close(self) -> None:
+        """انتظار الكتابات المعلّقة ثم إغلاق القاعدة."""
+        self._writer.shutdown(wait=True)
+        self._db.close()
+
     # ---------- عمليات أساسيّة ---------- #
     def create(self, guild_id: int, owner_id: int, name: str) -> None:
         g = self._data.setdefault(str(guild_id), {})
         if name in g:
             raise ValueError("اسم هذه القائمة مستخدم بالفعل فى هذا السيرفر.")
-        g[name] = {"owner": str(owner_id), "urls": []}
-        self._flush()
+        g[name] = {"owner": str(owner_id), "tracks": []}
+        self._owned.setdefault(str(owner_id), set()).add((str(guild_id), name))
+        self._write("INSERT INTO playlists (guild, name, owner) VALUES (?, ?, ?)",
+                    str(guild_id), name, str(owner_id))
 
-    def add_track(self, guild_id: int, owner_id: int, name: str, url: str) -> None:
+    def add_track(self, guild_id: int, owner_id: int, name: str, url: str,
+                  meta: Optional[Dict] = None) -> None:
         rec = self._get_record(guild_id, name)
         if rec is None:
             raise KeyError("القائمة غير موجودة.")
         if rec["owner"] != str(owner_id) and guild_id != 0:
             raise PermissionError("فقط مالك القائمة يستطيع تعديلها.")
-        rec["urls"].append(url)
-        self._flush()
+        meta = meta or {}
+        track = {"url": url}
+        if meta.get("title"):
+            track.update(title=meta["title"], duration=meta.get("duration"), id=meta.get("id"))
+        self._append(rec, track)
+        self._write(f"INSERT INTO tracks (playlist_id, pos, url, title, duration, cid) "
+                    f"VALUES ({_PID}, ?, ?, ?, ?, ?)",
+                    str(guild_id), name, len(rec["tracks"]) - 1, url,
+                    track.get("title"), track.get("duration"), track.get("id"))
+
+    def set_meta(self, url: str, title: str, duration: Optional[float],
+                 cid: Optional[str]) -> None:
+        """حفظ بيانات مقطع محلول لكل نسخه فى كل القوائم."""
+        tracks = self._by_url.get(url)
+        if not tracks or not title:
+            return
+        for t in tracks:
+            t.update(title=title, duration=duration, id=cid)
+        self._notify(url, tracks[0])
+        self._write("UPDATE tracks SET title = ?, duration = ?, cid = ? WHERE url = ?",
+                    title, duration, cid, url)
 
     def remove_track(self, guild_id: int, owner_id: int, name: str, index: int) -> None:
         rec = self._get_record(guild_id, name)
@@ -49,10 +216,15 @@ class PlaylistStore:
             raise KeyError("القائمة غير موجودة.")
         if rec["owner"] != str(owner_id):
             raise PermissionError("فقط مالك القائمة يستطيع تعديلها.")
-        if not 1 <= index <= len(rec["urls"]):
+        if not 1 <= index <= len(rec["tracks"]):
             raise IndexError("رقم مقطع غير صحيح.")
-        rec["urls"].pop(index - 1)
-        self._flush()
+        self._forget([rec["tracks"].pop(index - 1)])
+        # الحذف وإزاحة المواضع معًا: لا فجوة فى pos إن فشلت إحداهما
+        self._transaction(
+            (f"DELETE FROM tracks WHERE playlist_id = {_PID} AND pos = ?",
+             (str(guild_id), name, index - 1)),
+            (f"UPDATE tracks SET pos = pos - 1 WHERE playlist_id = {_PID} AND pos > ?",
+             (str(guild_id), name, index - 1)))
 
     def delete(self, guild_id: int, owner_id: int, name: str) -> None:
         g = self._data.get(str(guild_id))
@@ -60,8 +232,10 @@ class PlaylistStore:
             raise KeyError("القائمة غير موجودة.")
         if g[name]["owner"] != str(owner_id):
             raise PermissionError("فقط مالك القائمة يستطيع الحذف.")
-        del g[name]
-        self._flush()
+        self._forget(g.pop(name)["tracks"])
+        self._owned.get(str(owner_id), set()).discard((str(guild_id), name))
+        self._write("DELETE FROM playlists WHERE guild = ? AND name = ?",
+                    str(guild_id), name)
 
     # ---------- استرجاع ---------- #
     def list_names(self, guild_id: int, user_id: int) -> List[str]:
@@ -69,18 +243,31 @@ class PlaylistStore:
         # قوائم السيرفر
         names.update(self._data.get(str(guild_id), {}).keys())
         # قوائم يملكها المستخدم فى أى سيرفر
-        for g in self._data.values():
-            for n, rec in g.items():
-                if rec["owner"] == str(user_id):
-                    names.add(n)
+        names.update(n for _, n in self._owned.get(str(user_id), ()))
         return sorted(names)
 
-    def get_urls(self, guild_id: int, user_id: int, name: str) -> Optional[List[str]]:
+    def all_urls(self) -> List[str]:
+        """كل الروابط المحفوظة فى أى قائمة (لتثبيتها فى الكاش)."""
+        return list(self._by_url)
+
+    def titled_tracks(self) -> Iterator[Track]:
+        """مقطع واحد لكل رابط معروف العنوان (لفهرس البحث المحلى)."""
+        for tracks in self._by_url.values():
+            if tracks[0].get("title"):
+                yield tracks[0]
+
+    def get_tracks(self, guild_id: int, user_id: int, name: str) -> Optional[List[Track]]:
         # أولوية: القائمة فى هذا السيرفر – ثم قوائم يملكها المستخدم
         rec = self._get_record(guild_id, name)
-        if rec:
-            return list(rec["urls"])
-        for g in self._data.values():
-            if name in g and g[name]["owner"] == str(user_id):
-                return list(g[name]["urls"])
-        return None
+        if rec is None:
+            for gid, n in self._owned.get(str(user_id), ()):
+                if n == name:
+                    rec = self._data[gid][n]
+                    break
+            else:
+                return None
+        return [dict(t) for t in rec["tracks"]]
+
+    def get_urls(self, guild_id: int, user_id: int, name: str) -> Optional[List[str]]:
+        tracks = self.get_tracks(guild_id, user_id, name)
+        return None if tracks is None else [t["url"] for t in tracks]
@@ -0,0 +1,65 @@
+# modules/queue_snapshot.py
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from modules.track import Track
+
+# بيانات المقطع المحفوظة (ما يكفى لإعادة بنائه؛ روابط البث المؤقّتة لا تُحفظ)
+_FIELDS = ("url", "title", "duration", "id", "is_playlist_item", "is_live")
+
+
+class QueueSnapshot:
+    """
+    لقطة مدمجة للطوابير الحيّة على القرص (إعادة تشغيل دافئة بعد نشر أو انهيار):
+    • جدول مقاطع مشترك بين السيرفرات (صفوف بترتيب _FIELDS) والطابور فهارس فيه
+    • لكل سيرفر: القناة الصوتيّة والنصّيّة، الفهرس، موضع التشغيل، الإيقاف المؤقت
+    • الكتابة ذرّيّة (ملف مؤقّت ثم os.replace) وتُتخطّى إن لم يتغيّر شىء
+    """
+    VERSION = 1
+
+    def __init__(self, path: Path = Path("queues.json")) -> None:
+        self.path = path
+        self._last: Optional[str] = None
+
+    def save(self, guilds: Dict[int, dict]) -> bool:
+        """guilds: {gid: {voice, text, index, offset, paused, queue: [Track…]}}."""
+        table, rows, out = {}, [], {}
+        for gid, g in guilds.items():
+            refs = []
+            for t in g["queue"]:
+                ref = table.get(t.url)
+                if ref is None:
+                    ref = table[t.url] = len(rows)
+                    rows.append([t.get(k) for k in _FIELDS])
+                refs.append(ref)
+            out[str(gid)] = dict(g, queue=refs)
+        raw = json.dumps({"v": self.VERSION, "tracks": rows, "guilds": out},
+                         ensure_ascii=False, separators=(",", ":"))
+        if raw == self._last:
+            return False
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(raw, encoding="utf-8")
+        os.replace(tmp, self.path)
+        self._last = raw
+        return True
+
+    def load(self, max_age: float) -> Dict[int, dict]:
+        """اللقطة بطوابير من Track؛ فارغة إن لم توجد أو كانت أقدم من max_age ثانية."""
+        try:
+            if time.time() - self.path.stat().st_mtime > max_age:
+                return {}
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        if data.get("v") != self.VERSION:
+            return {}
+        rows = data["tracks"]
+        guilds = {}
+        for gid, g in data["guilds"].items():
+            # كل سيرفر يأخذ نسخه الخاصّة (العناصر تُعدَّل أثناء التشغيل)
+            queue = [Track(**dict(zip(_FIELDS, rows[i]))) for i in g["queue"]]
+            guilds[int(gid)] = dict(g, queue=queue)
+        return guilds
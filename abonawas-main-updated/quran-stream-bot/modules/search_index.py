@@ -0,0 +1,117 @@
+# modules/search_index.py
+import re
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+_TASHKEEL = re.compile(r"[\u064B-\u065F\u0670\u0640]")   # حركات + ألف خنجرية + تطويل
+_PUNCT    = re.compile(r"[^\w\s]|_", re.U)
+_SPACES   = re.compile(r"\s+")
+_ABD      = re.compile(r"\bعبد\s+")               # «عبد الباسط» = «عبدالباسط»
+_CHARMAP  = str.maketrans({
+    "أ": "ا", "إ": "ا", "آ": "ا", "ٱ": "ا",
+    "ى": "ي", "ئ": "ي", "ؤ": "و", "ة": "ه", "ء": "",
+    **{chr(0x0660 + d): str(d) for d in range(10)},        # ٠-٩
+    **{chr(0x06F0 + d): str(d) for d in range(10)},        # ۰-۹
+})
+
+
+def normalize_ar(text: str) -> str:
+    """توحيد النص العربى: التشكيل، صور الألف/الهمزة، التاء المربوطة، الأرقام الهندية."""
+    text = _TASHKEEL.sub("", text or "").translate(_CHARMAP).lower()
+    text = _SPACES.sub(" ", _PUNCT.sub(" ", text)).strip()
+    return _ABD.sub("عبد", text)
+
+
+def _strip_al(t: str) -> str:
+    # «الفاتحة» و«فاتحة» نفس الكلمة: نحذف «ال» من الكلمات الطويلة
+    return t[2:] if t.startswith("ال") and len(t) > 4 else t
+
+
+def _tokens(norm: str) -> List[str]:
+    tokens = []
+    for t in norm.split():
+        tokens.append(_strip_al(t))
+        # «عبدالباسط» (دمج _ABD) يُطابَق أيضًا بـ«الباسط» وحدها؛ نفس الدالّة
+        # للمستندات والاستعلامات → «عبد الباسط» كاملة تبقى مطابقة تامّة
+        if t.startswith("عبد") and len(t) >= 6:
+            tokens.append(_strip_al(t[3:]))
+    return tokens
+
+
+def _grams(tokens: Iterable[str], n: int = 3) -> Set[str]:
+    grams = set()
+    for t in tokens:
+        t = f" {t} "
+        grams.update(t[i:i + n] for i in range(max(1, len(t) - n + 1)))
+    return grams
+
+
+class SearchIndex:
+    """
+    فهرس بحث محلى (n-gram + مطابقة بادئة الكلمات) لعناوين المقاطع المعروفة:
+    • الدرجة = 0.6 × نسبة كلمات الاستعلام المطابقة ببادئة + 0.4 × تغطية الـ trigrams
+    • يُجيب فى أجزاء من الملّي ثانية؛ ما دون MIN_SCORE يُحال إلى يوتيوب
+    • كل مستند يعرف مصادره (الكاش، القوائم المحفوظة، طابور سيرفر…) ويُحذف
+      مع زوال آخرها → الفهرس يتبع ما هو معروف فعلًا ولا يكبر بلا حدّ
+    """
+    MIN_SCORE = 0.75
+
+    def __init__(self) -> None:
+        self._docs: Dict[str, dict] = {}                 # url → {title, duration, tokens, grams}
+        self._postings: Dict[str, Set[str]] = defaultdict(set)
+        self._sources: Dict[str, Set[str]] = {}          # url → المصادر التى تعرف عنوانه
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    def add(self, url: str, title: str, duration: Optional[float] = None,
+            source: str = "") -> None:
+        if not title or title == "—":
+            return
+        if url in self._docs:
+            self._sources[url].add(source)
+            return
+        tokens = _tokens(normalize_ar(title))
+        grams = _grams(tokens)
+        self._docs[url] = {"title": title, "duration": duration,
+                           "tokens": tokens, "grams": grams}
+        self._sources[url] = {source}
+        for g in grams:
+            self._postings[g].add(url)
+
+    def remove(self, url: str, source: str = "") -> None:
+        """إسقاط مصدر واحد للمستند؛ يُحذف المستند حين لا يبقى له مصدر."""
+        sources = self._sources.get(url)
+        if sources is None:
+            return
+        sources.discard(source)
+        if sources:
+            return
+        del self._sources[url]
+        for g in self._docs.pop(url)["grams"]:
+            urls = self._postings[g]
+            urls.discard(url)
+            if not urls:
+                del self._postings[g]
+
+    def query(self, text: str, limit: int = 5) -> List[Tuple[float, dict]]:
+        """[(درجة, {url, title, duration})…] مرتّبة تنازليًا."""
+        q_tokens = _tokens(normalize_ar(text))
+        if not q_tokens:
+            return []
+        q_grams = _grams(q_tokens)
+
+        hits: Dict[str, int] = defaultdict(int)
+        for g in q_grams:
+            for url in self._postings.get(g, ()):
+                hits[url] += 1
+
+        scored = []
+        for url, common in hits.items():
+            doc = self._docs[url]
+            matched = sum(any(d.startswith(q) for d in doc["tokens"]) for q in q_tokens)
+            score = 0.6 * matched / len(q_tokens) + 0.4 * common / len(q_grams)
+            scored.append((round(score, 3),
+                           {"url": url, "title": doc["title"], "duration": doc["duration"]}))
+        scored.sort(key=lambda s: s[0], reverse=True)
+        return scored[:limit]
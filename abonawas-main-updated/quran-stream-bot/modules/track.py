@@ -0,0 +1,78 @@
+# modules/track.py
+from typing import Any, Iterable, Mapping, Optional, Union
+
+
+class Track:
+    """
+    عنصر طابور مدمج (__slots__ بدل dict حرّ: ~⅓ الذاكرة لكل عنصر).
+    يحتفظ بواجهة dict التى يستخدمها المشغّل (item["url"], get, in, update, pop)
+    حيث «غير موجود» = None؛ المفاتيح غير المعروفة تُتجاهل عند update.
+    """
+    __slots__ = ("url", "title", "duration", "id", "path", "codec", "bitrate",
+                 "is_playlist_item", "is_live", "stream_url", "http_headers",
+                 "requested_at")
+
+    def __init__(self, url: str, **fields: Any) -> None:
+        self.url = url
+        for key in self.__slots__[1:]:
+            setattr(self, key, fields.get(key))
+
+    @classmethod
+    def of(cls, data: Union["Track", Mapping[str, Any]]) -> "Track":
+        if isinstance(data, Track):
+            return data
+        return cls(**{k: v for k, v in data.items() if k in cls.__slots__})
+
+    # ---------- واجهة dict ---------- #
+    def get(self, key: str, default: Any = None) -> Any:
+        value = getattr(self, key, None) if key in self.__slots__ else None
+        return default if value is None else value
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any) -> None:
+        setattr(self, key, value)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def update(self, other: Union["Track", Mapping[str, Any], Iterable] = (),
+               **fields: Any) -> None:
+        if isinstance(other, Track):
+            other = {k: other.get(k) for k in self.__slots__ if k in other}
+        for key, value in dict(other, **fields).items():
+            if key in self.__slots__:
+                setattr(self, key, value)
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        value = self.get(key, default)
+        if key in self.__slots__ and key != "url":
+            setattr(self, key, None)
+        return value
+
+    def setdefault(self, key: str, value: Any) -> Any:
+        if key not in self:
+            self[key] = value
+        return self.get(key)
+
+    def compact(self) -> None:
+        """تفريغ ما لا يلزم لطابور خامل (روابط البث تنتهى صلاحيّتها على أى حال)."""
+        self.stream_url = self.http_headers = self.requested_at = None
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{k}={getattr(self, k)!r}" for k in self.__slots__
+                           if getattr(self, k) is not None)
+        return f"Track({fields})"
+
+
+def as_tracks(res: Optional[Union[Mapping, list]]) -> list:
+    """نتيجة Downloader (dict أو قائمة dicts) → قائمة Track."""
+    if res is None:
+        return []
+    if isinstance(res, list):
+        return [Track.of(r) for r in res]
+    return [Track.of(res)]
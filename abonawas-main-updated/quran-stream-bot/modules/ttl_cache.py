@@ -0,0 +1,68 @@
+# modules/ttl_cache.py
+import json
+import os
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Hashable, Optional
+
+
+class TTLCache:
+    """
+    ذاكرة مؤقّتة محدودة الحجم (LRU) مع صلاحيّة زمنيّة لكل مفتاح
+    + عدّادات hits/misses، وحفظ اختيارى فى ملف JSON (للمفاتيح النصّيّة).
+    """
+    def __init__(self, maxsize: int, ttl: float, path: Optional[Path] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.path = path
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if path is not None and path.exists():
+            self._load()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None or item[0] < time.time():
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def set(self, key: Hashable, value: Any) -> None:
+        self._data[key] = (time.time() + self.ttl, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    # ---------- حفظ ---------- #
+    def _load(self) -> None:
+        try:
+            rows = json.loads(self.path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for key, expires, value in rows:
+            if expires > now:
+                self._data[key] = (expires, value)
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps([[k, e, v] for k, (e, v) in self._data.items()],
+                                  ensure_ascii=False),
+                       encoding="utf-8")
+        os.replace(tmp, self.path)
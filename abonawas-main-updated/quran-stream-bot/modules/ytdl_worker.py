@@ -0,0 +1,62 @@
+# modules/ytdl_worker.py
+"""
+دوال yt-dlp على مستوى الوحدة (قابلة للـ pickle) لتعمل إمّا فى thread
+أو داخل عامل ProcessPoolExecutor؛ المُدخلات والمُخرجات dicts بسيطة فقط.
+"""
+import os
+import threading
+from typing import List, Optional, Union
+
+Cancel = Union[threading.Event, str, None]   # Event (thread) أو مسار ملف-علم (process)
+
+
+class ExtractError(Exception):
+    """خطأ yt-dlp بصيغة قابلة للنقل بين العمليّات."""
+
+
+def warm() -> None:
+    """initializer للعامل: تحميل yt-dlp ومستخرجاته مرّة واحدة."""
+    from yt_dlp import YoutubeDL
+    YoutubeDL({"quiet": True}).close()
+
+
+def _cancelled(cancel: Cancel) -> bool:
+    if cancel is None:
+        return False
+    if isinstance(cancel, str):
+        return os.path.exists(cancel)
+    return cancel.is_set()
+
+
+def extract(url: str, opts: dict, download: bool = True, cancel: Cancel = None) -> dict:
+    from yt_dlp import YoutubeDL
+    from yt_dlp.utils import DownloadCancelled, DownloadError
+
+    opts = dict(opts)
+    if cancel is not None:
+        def _hook(_):
+            if _cancelled(cancel):
+                raise DownloadCancelled("أُلغى التحميل")
+        opts["progress_hooks"] = [_hook]
+
+    try:
+        with YoutubeDL(opts) as ydl:
+            return ydl.sanitize_info(ydl.extract_info(url, download=download))
+    except DownloadCancelled:
+        raise ExtractError("cancelled") from None
+    except DownloadError as exc:
+        raise ExtractError(str(exc)) from None
+
+
+def search(query: str, limit: int) -> List[dict]:
+    from yt_dlp import YoutubeDL
+
+    # مسطّح: قائمة النتائج فقط دون حلّ صيغ خمسة مقاطع لن يُشغَّل أغلبها
+    opts = {"quiet": True, "extract_flat": True, "skip_download": True}
+    with YoutubeDL(opts) as ydl:
+        data = ydl.extract_info(f"ytsearch{limit}:{query}", download=False)
+    return [{"id": e["id"],
+             "title": e.get("title"),
+             "duration": e.get("duration"),
+             "thumbnail": e.get("thumbnail") or (e.get("thumbnails") or [{}])[-1].get("url")}
+            for e in data.get("entries", []) if e]